@@ -1,13 +1,17 @@
+import functools
+import inspect
 import itertools
 from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple
 
 import numpy as np
 import pandas as pd
 import polars as pl
-from ta.trend import WMAIndicator
-from ta.volatility import AverageTrueRange, BollingerBands, KeltnerChannel
 from ta.volume import on_balance_volume
 
+from src.mtal.cache import cached_indicator, indicator_cache
+from src.mtal.compact import compact_columns
+from src.mtal.profiling import from_pandas, indicator, to_pandas
 from src.mtal.utils import get_ma_names
 
 THRESHOLD_CROSS = 3
@@ -19,6 +23,11 @@ HISTORY_LIMIT = 200
 MINIMAL_SPACE_LINE_POINTS = 2
 VOLATILITY_COMPRESSION_HISTORY = 10
 VOLATILITY_COMPRESSION_THRESHOLD = 1
+WMA_BLOCK = 256
+# brick size factors from which renko_bricks scans them as one vector per bar
+RENKO_VECTOR_FACTORS = 64
+# months of each reset period of the anchored OBV
+ANCHOR_MONTHS = {"1M": 1, "3M": 3, "6M": 6, "1Y": 12}
 
 
 @dataclass
@@ -32,88 +41,118 @@ class Line:
     b: float = 0.0
 
 
+@indicator
+@cached_indicator("Close", "Volume")
 def compute_rsi(df: pl.DataFrame, window=14) -> pl.DataFrame:
-    df_pd = df.to_pandas()
-
-    if len(df_pd) == 0:
+    if len(df) == 0:
         return pl.DataFrame()
-    df_pd["Change"] = df_pd["Close"].diff()
-
-    df_pd["Gain"] = df_pd["Change"].mask(df_pd["Change"] < 0, 0)
-    df_pd["Loss"] = -df_pd["Change"].mask(df_pd["Change"] > 0, 0)
 
-    df_pd["Avg Gain"] = df_pd["Gain"].ewm(alpha=1 / window, adjust=False).mean()
-    df_pd["Avg Loss"] = df_pd["Loss"].ewm(alpha=1 / window, adjust=False).mean()
-
-    df_pd["RS"] = df_pd["Avg Gain"] / df_pd["Avg Loss"]
-    df_pd["ema5"] = df_pd["Close"].ewm(span=5, adjust=False).mean()
-
-    df_pd["RSI"] = 100 - (100 / (1 + df_pd["RS"]))
-    df_pd["Volume_MA"] = df_pd["Volume"].rolling(window=20).mean()
+    change = pl.col("Close").diff().cast(pl.Float64)
+    df = df.with_columns(
+        change.alias("Change"),
+        pl.when(change < 0).then(0).otherwise(change).alias("Gain"),
+        -pl.when(change > 0).then(0).otherwise(change).alias("Loss"),
+    )
+    df = df.with_columns(
+        _ewm_mean(pl.col("Gain"), alpha=1 / window).alias("Avg Gain"),
+        _ewm_mean(pl.col("Loss"), alpha=1 / window).alias("Avg Loss"),
+    )
+    df = df.with_columns((pl.col("Avg Gain") / pl.col("Avg Loss")).alias("RS"))
 
-    return pl.from_pandas(df_pd)
+    return df.with_columns(
+        _ewm_mean(pl.col("Close"), span=5).alias("ema5"),
+        (100 - (100 / (1 + pl.col("RS")))).alias("RSI"),
+        pl.col("Volume").rolling_mean(window_size=20).alias("Volume_MA"),
+    )
 
 
+@indicator
+@cached_indicator("Close", "Volume")
 def compute_obv(df: pl.DataFrame) -> pl.DataFrame:
-    df_pd = df.to_pandas()
+    df_pd = to_pandas(df)
 
     df_pd["OBV"] = on_balance_volume(df_pd["Close"], df_pd["Volume"])
 
-    return pl.from_pandas(df_pd)
+    return from_pandas(df_pd)
 
 
+@indicator
+@cached_indicator("Close Time", "Close", "Volume")
 def compute_anchored_obv(df: pl.DataFrame, reset_period="1M"):
-    df_pd = df.to_pandas()
-
-    df_pd["Close Time"] = pd.to_datetime(df_pd["Close Time"])
-    df_pd.sort_values("Close Time", inplace=True)
-
-    # Créer un identifiant de période pour chaque groupe de réinitialisation
-    df_pd["Period"] = df_pd["Close Time"].dt.to_period(reset_period)
-
-    # Déterminer le début de chaque période de réinitialisation en fonction de l'année civile
-    if reset_period == "1M":
-        df_pd["Period"] = (
-            df_pd["Close Time"].dt.year.astype(str)
-            + "-"
-            + df_pd["Close Time"].dt.month.astype(str).str.zfill(2)
-        )
-    elif reset_period == "3M":
-        df_pd["Period"] = (
-            df_pd["Close Time"].dt.year.astype(str)
-            + "-"
-            + ((df_pd["Close Time"].dt.month - 1) // 3 + 1).astype(str).str.zfill(2)
-        )
-    elif reset_period == "6M":
-        df_pd["Period"] = (
-            df_pd["Close Time"].dt.year.astype(str)
-            + "-"
-            + ((df_pd["Close Time"].dt.month - 1) // 6 + 1).astype(str).str.zfill(2)
+    anchored_obv = _anchored_obv_columns(df, [reset_period])[reset_period]
+    return df.with_columns(anchored_obv.alias("Anchored_OBV"))
+
+
+def compute_anchored_obvs(
+    df: pl.DataFrame, reset_periods=tuple(ANCHOR_MONTHS)
+) -> pl.DataFrame:
+    """
+    The anchored OBV of every reset period in a single pass over df, as
+    columns named by period. Each one is stored in the indicator cache as if
+    computed by compute_anchored_obv, so the backtesters built on the same
+    data read it.
+    """
+    reset_periods = list(dict.fromkeys(reset_periods))
+    anchored_obvs = _anchored_obv_columns(df, reset_periods)
+
+    for reset_period in reset_periods:
+        key = compute_anchored_obv.cache_key(df, reset_period)
+        if key is not None:
+            anchored_obv = anchored_obvs[reset_period].alias("Anchored_OBV")
+            indicator_cache.put(key, compact_columns([anchored_obv]))
+    return anchored_obvs
+
+
+def _anchored_obv_columns(df: pl.DataFrame, reset_periods) -> pl.DataFrame:
+    """
+    OBV restarted at 0 on the first bar of each calendar month, quarter,
+    half or year of Close Time, unchanged closes counting as down bars,
+    truncated to int. Computed in the Close Time order, returned in the
+    rows order of df.
+    """
+    unknown = set(reset_periods) - set(ANCHOR_MONTHS)
+    if unknown:
+        raise ValueError(
+            f"Unknown reset periods {unknown}, expected {list(ANCHOR_MONTHS)}"
         )
-    elif reset_period == "1Y":
-        df_pd["Close Time"].dt.year.astype(str)
 
-    df_pd["Anchored_OBV"] = 0
+    close_time = pl.col("Close Time")
+    parsed_time = close_time
+    if df["Close Time"].dtype == pl.Utf8:
+        parsed_time = close_time.str.to_datetime()
+    elif df["Close Time"].dtype.is_integer():
+        parsed_time = pl.from_epoch(close_time, time_unit="ms")
+    direction = pl.when(pl.col("Close").diff() > 0).then(1).otherwise(-1)
+    signed_volume = direction * pl.col("Volume")
+
+    anchored_obvs = []
+    for reset_period in reset_periods:
+        months = ANCHOR_MONTHS[reset_period]
+        month = close_time.dt.month().cast(pl.Int32)
+        period = close_time.dt.year() * 12 + (month - 1) // months
+        anchored_obv = (signed_volume.cum_sum() - signed_volume.first()).over(period)
+        anchored_obvs.append(anchored_obv.cast(pl.Int64).alias(reset_period))
 
-    for period, period_data in df_pd.groupby("Period"):
-        change_vector = period_data["Close"].diff()
-        direction = [1 if change > 0 else -1 for change in change_vector]
-
-        period_obv = (direction * period_data["Volume"]).cumsum()
-        period_obv -= period_obv.iloc[0]
-
-        # Mise à jour de la colonne OBV dans les données principales
-        df_pd.loc[period_data.index, "Anchored_OBV"] = period_obv.astype(int)
-    df_pd.drop(columns=["Period"], inplace=True)
-
-    return pl.from_pandas(df_pd)
+    return (
+        df.lazy()
+        .select(parsed_time, "Close", "Volume")
+        .with_row_index()
+        .sort("Close Time", maintain_order=True)
+        .select("index", *anchored_obvs)
+        .sort("index")
+        .drop("index")
+        .collect()
+    )
 
 
+@indicator
+@cached_indicator("Close Time", "Close")
 def compute_vaa_momentum(df: pl.DataFrame):
-    df_pd = df.to_pandas()
+    df_pd = to_pandas(df)
 
     # Convertir les dates en datetime et trier
-    df_pd["Close Time"] = pd.to_datetime(df_pd["Close Time"])
+    unit = "ms" if pd.api.types.is_integer_dtype(df_pd["Close Time"]) else None
+    df_pd["Close Time"] = pd.to_datetime(df_pd["Close Time"], unit=unit)
     df_pd.sort_values("Close Time", inplace=True)
 
     # Calculer le momentum pour 1, 3, 6 et 12 mois
@@ -131,234 +170,560 @@ def compute_vaa_momentum(df: pl.DataFrame):
 
     # Calcul du VAA Momentum
     df_pd["VAA_Momentum"] = (12 * m1 + 4 * m3 + 2 * m6 + m12) / 19
+    # back to the rows order of df, the new column is appended to it
+    df_pd.sort_index(inplace=True)
 
-    return pl.from_pandas(df_pd)
+    return from_pandas(df_pd)
 
 
+@indicator
+@cached_indicator("OBV")
 def compute_hma_on_obv(df_in: pl.DataFrame, span=9) -> pl.DataFrame:
-    df = df_in.to_pandas()
-
-    wma_half = weighted_moving_average(df["OBV"], span // 2)
-    wma_full = weighted_moving_average(df["OBV"], span)
-
-    df["data_hull"] = 2 * wma_half - wma_full
-    df[get_ma_names(span, prefix="hma", suffix="_on_OBV")] = [
-        int(i) if not np.isnan(i) else 0
-        for i in weighted_moving_average(df["data_hull"], int(np.sqrt(span)))
-    ]
-
-    return pl.from_pandas(df)
+    name = get_ma_names(span, prefix="hma", suffix="_on_OBV")
+    return df_in.with_columns(**_hull_columns(df_in["OBV"], "hma", span, name))
 
 
+@indicator
+@cached_indicator("Close", "Volume")
 def compute_vzo(df_in: pl.DataFrame, window=14) -> pl.DataFrame:
-    df = df_in.to_pandas()
-    if len(df) == 0:
+    if len(df_in) == 0:
         return pl.DataFrame()
 
-    df["Price Change"] = df["Close"].diff()
-    df["Volume Change"] = df["Volume"].diff()
-
-    conditions = [
-        df["Price Change"] > 0,
-        df["Price Change"] < 0,
-    ]
-
-    choices = [
-        df["Volume"],  # Si le prix monte, le volume total est pris
-        -df["Volume"],  # Si le prix descend, le volume total est négatif
-    ]
-
-    df["Qualified Volume"] = np.select(conditions, choices)
-
-    df["VZO Nominator"] = df["Qualified Volume"].ewm(span=window, adjust=False).mean()
-    df["VZO Denominator"] = df["Volume"].ewm(span=window, adjust=False).mean()
-
-    # df["VZO Nominator"] = ema_indicator(df["Qualified Volume"], window=window)
-    # df["VZO Denominator"] = ema_indicator(df["Volume"], window=window)
+    price_change = pl.col("Close").diff().cast(pl.Float64)
+    df = df_in.with_columns(
+        price_change.alias("Price Change"),
+        pl.col("Volume").diff().cast(pl.Float64).alias("Volume Change"),
+        # Si le prix monte, le volume total est pris, s'il descend il est négatif
+        pl.when(price_change > 0)
+        .then(pl.col("Volume"))
+        .when(price_change < 0)
+        .then(-pl.col("Volume"))
+        .otherwise(0)
+        .alias("Qualified Volume"),
+    )
+    df = df.with_columns(
+        _ewm_mean(pl.col("Qualified Volume"), span=window).alias("VZO Nominator"),
+        _ewm_mean(pl.col("Volume"), span=window).alias("VZO Denominator"),
+    )
 
-    df["VZO"] = (df["VZO Nominator"] / df["VZO Denominator"]) * 100
-    return pl.from_pandas(df)
+    return df.with_columns(
+        (pl.col("VZO Nominator") / pl.col("VZO Denominator") * 100).alias("VZO")
+    )
 
 
+@indicator
+@cached_indicator("Close")
 def compute_ema(df_in: pl.DataFrame, span=9) -> pl.DataFrame:
-    df = df_in.to_pandas()
-    ema = df["Close"].ewm(span=span, adjust=False).mean()
-    df[get_ma_names(span)] = ema
-    return pl.from_pandas(df)
+    return df_in.with_columns(**_moving_average_columns("ema", span))
 
 
+@indicator
+@cached_indicator("Close", "Volume")
 def compute_vwma(df_in: pl.DataFrame, span=9) -> pl.DataFrame:
-    volume_prices = df_in["Close"] * df_in["Volume"]
-
-    sum_volume_prices = volume_prices.rolling_sum(window_size=span)
-    sum_volumes = df_in["Volume"].rolling_sum(window_size=span)
-
-    vwma = sum_volume_prices / sum_volumes
-
-    vwma_col_name = f"vwma_{span}"
-
-    return df_in.with_columns(vwma.alias(vwma_col_name))
+    return df_in.with_columns(**_moving_average_columns("vwma", span))
+
+
+def _wma_block(span: int) -> int:
+    return WMA_BLOCK * -(-span // WMA_BLOCK)
+
+
+def _wma_prefix_sums(values: np.ndarray, block: int) -> Dict[str, np.ndarray]:
+    """
+    Sums of values and of values weighted by their index in the block,
+    restarted every block bars with NaN counting as 0, up to each bar
+    ("end"), before it in its block ("start") and over the previous block
+    ("previous"), and the running count of NaN
+    """
+    missing = np.isnan(values)
+    padded = np.zeros(-(-len(values) // block) * block)
+    padded[: len(values)] = np.where(missing, 0.0, values)
+    blocks = padded.reshape(-1, block)
+    prefix_sums = {"missing": np.cumsum(missing)}
+    for name, weighted in (("", blocks), ("weighted_", blocks * np.arange(block))):
+        sums = np.cumsum(weighted, axis=1)
+        start = np.zeros_like(sums)
+        start[:, 1:] = sums[:, :-1]
+        previous = np.zeros_like(sums)
+        previous[1:] = sums[:-1, -1:]
+        for part, part_sums in (
+            ("end", sums),
+            ("start", start),
+            ("previous", previous),
+        ):
+            prefix_sums[f"{part}_{name}sums"] = part_sums.ravel()[: len(values)]
+    return prefix_sums
+
+
+def weighted_moving_average(values, span=2, prefix_sums=None) -> np.ndarray:
+    """
+    ta WMAIndicator in O(n) as a float64 array, NaN until span values are
+    seen and over windows with a NaN. The window sums are differences of
+    prefix sums restarted every WMA_BLOCK bars, which keeps their rounding
+    error bounded on long histories. prefix_sums, a dict by block size, lets
+    calls on the same values share them.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if not 1 <= span <= len(values):
+        return result
+
+    block = _wma_block(span)
+    if prefix_sums is None:
+        prefix_sums = {}
+    if block not in prefix_sums:
+        prefix_sums[block] = _wma_prefix_sums(values, block)
+    # each window starts span - 1 bars before its end, in the same block or
+    # the previous one
+    window_end = {name: sums[span - 1 :] for name, sums in prefix_sums[block].items()}
+    window_start = {
+        name: sums[: len(values) - span + 1]
+        for name, sums in prefix_sums[block].items()
+    }
+    end = np.arange(span - 1, len(values))
+    start = end - span + 1
+    base = end - end % block
+    same_block = start >= base
+
+    start_sums = window_start["start_sums"]
+    start_weighted_sums = window_start["start_weighted_sums"]
+    tail_sums = window_end["previous_sums"] - start_sums
+    tail_weighted_sums = (
+        window_end["previous_weighted_sums"] - start_weighted_sums - block * tail_sums
+    )
+    window_sums = np.where(
+        same_block,
+        window_end["end_sums"] - start_sums,
+        window_end["end_sums"] + tail_sums,
+    )
+    window_weighted_sums = np.where(
+        same_block,
+        window_end["end_weighted_sums"] - start_weighted_sums,
+        window_end["end_weighted_sums"] + tail_weighted_sums,
+    )
 
+    weighted = window_weighted_sums - (start - 1 - base) * window_sums
+    missing = prefix_sums[block]["missing"]
+    has_nan = window_end["missing"] - np.where(start > 0, missing[start - 1], 0) > 0
+    result[span - 1 :] = np.where(has_nan, np.nan, weighted * (2 / (span * (span + 1))))
+    return result
+
+
+def _ewm_mean(expr: pl.Expr, **kwargs) -> pl.Expr:
+    """
+    pandas ewm(..., adjust=False).mean(), leading nulls skipped
+    """
+    return expr.ewm_mean(adjust=False, ignore_nulls=True, **kwargs)
+
+
+def _moving_average_columns(ma_type: str, span: int) -> Dict[str, pl.Expr]:
+    """
+    Columns added by compute_<ma_type>(df, span), as expressions
+    """
+    name = get_ma_names(span, prefix=ma_type)
+    close = pl.col("Close")
+    if ma_type == "ema":
+        return {name: _ewm_mean(close, span=span)}
+    elif ma_type == "vwma":
+        volume = pl.col("Volume")
+        vwma = (close * volume).rolling_sum(window_size=span) / volume.rolling_sum(
+            window_size=span
+        )
+        return {name: vwma}
+    raise ValueError(f"Unknown moving average type {ma_type}")
+
+
+def _hull_columns(
+    source: pl.Series, ma_type: str, span: int, name: str, prefix_sums=None
+) -> Dict[str, pl.Series]:
+    """
+    data_hull = 2 * half - full, the WMAs (hma) or EMAs (ehma) of span // 2
+    and span bars of source, and its WMA of sqrt(span) bars as name, in
+    float64 and 0 where undefined
+    """
+    if ma_type == "hma":
+        values = source.cast(pl.Float64).to_numpy()
+        if prefix_sums is None:
+            prefix_sums = {}
+        half = weighted_moving_average(values, span // 2, prefix_sums)
+        full = weighted_moving_average(values, span, prefix_sums)
+    elif ma_type == "ehma":
+        averages = (
+            source.cast(pl.Float64)
+            .to_frame()
+            .select(
+                _ewm_mean(pl.first(), span=span // 2).alias("half"),
+                _ewm_mean(pl.first(), span=span).alias("full"),
+            )
+        )
+        half = averages["half"].to_numpy()
+        full = averages["full"].to_numpy()
+    else:
+        raise ValueError(f"Unknown hull moving average type {ma_type}")
 
-def weighted_moving_average(close, span=2):
-    return WMAIndicator(close=close, window=span).wma()
+    data_hull = 2 * half - full
+    hma = weighted_moving_average(data_hull, int(np.sqrt(span)))
+    return {
+        "data_hull": pl.Series("data_hull", data_hull, nan_to_null=True),
+        name: pl.Series(name, np.where(np.isnan(hma), 0.0, hma)),
+    }
 
 
+@indicator
+@cached_indicator("Close")
 def compute_hma(df_in: pl.DataFrame, span=9) -> pl.DataFrame:
-    df = df_in.to_pandas()
-    wma_half = weighted_moving_average(df["Close"], span // 2)
-    wma_full = weighted_moving_average(df["Close"], span)
-    df["data_hull"] = 2 * wma_half - wma_full
-    df[get_ma_names(span, prefix="hma")] = [
-        int(i) if not np.isnan(i) else 0
-        for i in weighted_moving_average(df["data_hull"], int(np.sqrt(span)))
-    ]
-
-    return pl.from_pandas(df)
+    name = get_ma_names(span, prefix="hma")
+    return df_in.with_columns(**_hull_columns(df_in["Close"], "hma", span, name))
 
 
+@indicator
+@cached_indicator("Close")
 def compute_ehma(df_in: pl.DataFrame, span=9) -> pl.DataFrame:
-    df = df_in.to_pandas()
-    ema_half = df["Close"].ewm(span=span // 2, adjust=False).mean()
-    ema_full = df["Close"].ewm(span=span, adjust=False).mean()
-    df["data_hull"] = 2 * ema_half - ema_full
-    df[get_ma_names(span, prefix="ehma")] = [
-        int(i) if not np.isnan(i) else 0
-        for i in weighted_moving_average(df["data_hull"], int(np.sqrt(span)))
-    ]
-    return pl.from_pandas(df)
+    name = get_ma_names(span, prefix="ehma")
+    return df_in.with_columns(**_hull_columns(df_in["Close"], "ehma", span, name))
+
+
+MA_FUNCTIONS = {
+    "ema": compute_ema,
+    "vwma": compute_vwma,
+    "hma": compute_hma,
+    "ehma": compute_ehma,
+}
+
+
+def compute_mas(df: pl.DataFrame, spans, ma_type="ema") -> pl.DataFrame:
+    """
+    The moving average columns of every span in a single pass over df, polars
+    sharing the subexpressions common to the spans (EMAs) and the hulls the
+    prefix sums of Close. Each span is stored in the indicator cache as if
+    computed by its compute_<ma_type>, so the backtesters built on the same
+    data read it.
+    """
+    compute = MA_FUNCTIONS[ma_type]
+    spans = list(dict.fromkeys(spans))
+    names = [get_ma_names(span, prefix=ma_type) for span in spans]
+    if ma_type in ("hma", "ehma"):
+        prefix_sums: dict = {}
+        columns = {
+            span: _hull_columns(df["Close"], ma_type, span, name, prefix_sums)
+            for span, name in zip(spans, names)
+        }
+    else:
+        exprs = {span: _moving_average_columns(ma_type, span) for span in spans}
+        wide = df.lazy().select(
+            expr.alias(f"{span}/{name}")
+            for span, span_exprs in exprs.items()
+            for name, expr in span_exprs.items()
+        )
+        wide = wide.collect() if spans else pl.DataFrame()
+        columns = {
+            span: {name: wide[f"{span}/{name}"].alias(name) for name in span_exprs}
+            for span, span_exprs in exprs.items()
+        }
+
+    for span, span_columns in columns.items():
+        key = compute.cache_key(df, span)
+        if key is not None:
+            indicator_cache.put(key, compact_columns(span_columns.values()))
+
+    return df.with_columns(
+        compact_columns(columns[span][name] for span, name in zip(spans, names))
+    )
+
+
+def compute_ma_matrix(df: pl.DataFrame, spans, ma_type="ema") -> np.ndarray:
+    """
+    compute_mas as a float64 array of len(spans) x len(df)
+    """
+    names = [get_ma_names(span, prefix=ma_type) for span in spans]
+    mas = compute_mas(df, spans, ma_type)
+    return mas.select(pl.col(names).cast(pl.Float64)).to_numpy().T
 
 
+@indicator
+@cached_indicator("High", "Low", "Close")
 def compute_atr(df_in: pl.DataFrame, span=14):
-    df = df_in.to_pandas()
-    df["ATR"] = AverageTrueRange(
-        df["High"], df["Low"], df["Close"], window=span
-    ).average_true_range()
-    return pl.from_pandas(df)
+    return df_in.with_columns(_average_true_range(span).alias("ATR"))
+
+
+def _average_true_range(span: int) -> pl.Expr:
+    """
+    ta AverageTrueRange: 0 for the first span - 1 bars, the mean true range
+    of the first span bars, then Wilder smoothing
+    """
+    previous_close = pl.col("Close").shift(1)
+    true_range = pl.max_horizontal(
+        pl.col("High") - pl.col("Low"),
+        (pl.col("High") - previous_close).abs(),
+        (pl.col("Low") - previous_close).abs(),
+    )
+    bar = pl.int_range(0, pl.len())
+    seeded = (
+        pl.when(bar < span - 1)
+        .then(None)
+        .when(bar == span - 1)
+        .then(true_range.head(span).cum_sum().last() * (1 / span))
+        .otherwise(true_range)
+    )
+    return _ewm_mean(seeded, com=span - 1).fill_null(0)
 
 
+@indicator
+@cached_indicator("High", "Low", "Close")
 def compute_keltner_low(df_in: pl.DataFrame, span=20, window_ATR=3):
-    df = df_in.to_pandas()
-    df["keltner_low"] = KeltnerChannel(
-        df["High"],
-        df["Low"],
-        df["Close"],
-        window=span,
-        window_atr=window_ATR,
-        original_version=False,
-    ).keltner_channel_lband()
-
-    return pl.from_pandas(df)
+    return df_in.with_columns(
+        _keltner_channel(span, window_ATR, -2).alias("keltner_low")
+    )
 
 
+@indicator
+@cached_indicator("High", "Low", "Close")
 def compute_keltner_high(df_in: pl.DataFrame, span=20, window_ATR=3):
-    df = df_in.to_pandas()
-    df["keltner_high"] = KeltnerChannel(
-        df["High"],
-        df["Low"],
-        df["Close"],
-        window=span,
-        window_atr=window_ATR,
-        original_version=False,
-    ).keltner_channel_hband()
+    return df_in.with_columns(
+        _keltner_channel(span, window_ATR, 2).alias("keltner_high")
+    )
 
-    return pl.from_pandas(df)
 
+def _keltner_channel(span: int, window_ATR: int, multiplier: float) -> pl.Expr:
+    """
+    ta KeltnerChannel band with original_version=False, EMA of Close plus
+    multiplier ATR
+    """
+    typical_price = _ewm_mean(pl.col("Close"), span=span, min_periods=span)
+    return typical_price + multiplier * _average_true_range(window_ATR)
 
-def compute_BB(df_in: pl.DataFrame, window: int = 20, window_dev=2):
-    df = df_in.to_pandas()
-    BB = BollingerBands(df["Close"], window=window, window_dev=window_dev)
 
-    df["BB_hband"] = BB.bollinger_hband()
-    df["BB_mid"] = BB.bollinger_mavg()
-    df["BB_lband"] = BB.bollinger_lband()
-    return pl.from_pandas(df)
+@indicator
+@cached_indicator("Close")
+def compute_BB(df_in: pl.DataFrame, window: int = 20, window_dev=2):
+    return df_in.with_columns(**_bollinger_bands(window, window_dev))
 
 
-def compute_heikin_ashin(df_in: pl.DataFrame):
-    df = df_in.to_pandas()
+def _bollinger_bands(window: int, window_dev) -> Dict[str, pl.Expr]:
+    mavg = pl.col("Close").rolling_mean(window_size=window)
+    mstd = pl.col("Close").rolling_std(window_size=window, ddof=0)
+    return {
+        "BB_hband": mavg + window_dev * mstd,
+        "BB_mid": mavg,
+        "BB_lband": mavg - window_dev * mstd,
+    }
 
-    heikin_ashi_df = pd.DataFrame(
-        index=df.index, columns=["Open", "High", "Low", "Close"]
-    )
 
-    heikin_ashi_df["Close"] = (df["Open"] + df["High"] + df["Low"] + df["Close"]) / 4.0
-    heikin_ashi_df["Open"] = (df["Open"].shift(1) + df["Close"].shift(1)) / 2.0
-    heikin_ashi_df["High"] = (
-        heikin_ashi_df[["Open", "Close"]].join(df["High"]).max(axis=1)
-    )
-    heikin_ashi_df["Low"] = (
-        heikin_ashi_df[["Open", "Close"]].join(df["Low"]).min(axis=1)
+@indicator
+@cached_indicator("Open", "High", "Low", "Close")
+def compute_heikin_ashin(df_in: pl.DataFrame):
+    """
+    Heikin-Ashi candles. ha_Open follows its recursion from the first Open,
+    ha_Open[t] = (ha_Open[t - 1] + ha_Close[t - 1]) / 2, which is the EWM of
+    alpha 1/2 of the previous ha_Close, computed in one pass.
+    """
+    ha_close = (pl.col("Open") + pl.col("High") + pl.col("Low") + pl.col("Close")) / 4.0
+    previous_ha_close = ha_close.shift(1, fill_value=pl.col("Open").first())
+    ha_open = _ewm_mean(previous_ha_close, alpha=0.5)
+
+    df = df_in.with_columns(ha_close.alias("ha_Close"), ha_open.alias("ha_Open"))
+    ha_bodies = ["ha_Open", "ha_Close"]
+    return df.with_columns(
+        pl.max_horizontal(*ha_bodies, "High").alias("ha_High"),
+        pl.min_horizontal(*ha_bodies, "Low").alias("ha_Low"),
     )
 
-    heikin_ashi_df.iloc[0]["Open"] = df.iloc[0]["Open"]
-    heikin_ashi_df.iloc[0]["Close"] = (
-        df.iloc[0]["Open"]
-        + df.iloc[0]["High"]
-        + df.iloc[0]["Low"]
-        + df.iloc[0]["Close"]
-    ) / 4.0
-    heikin_ashi_df.iloc[0]["High"] = df.iloc[0]["High"]
-    heikin_ashi_df.iloc[0]["Low"] = df.iloc[0]["Low"]
-
-    df["ha_Close"] = heikin_ashi_df["Close"]
-    df["ha_Open"] = heikin_ashi_df["Open"]
-    df["ha_High"] = heikin_ashi_df["High"]
-    df["ha_Low"] = heikin_ashi_df["Low"]
-
-    return pl.from_pandas(df)
-
 
+def renko_bricks(closes, atr, brick_size_factors) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Renko bricks of closes for each brick size factor. The last brick moves
+    up, else down, by factor * atr when the close reaches it. Returns the
+    brick prices and directions (+1 up, -1 down, 0 none), of
+    len(brick_size_factors) x len(closes). The prices are scanned factor by
+    factor, or bar by bar over the vector of factors from RENKO_VECTOR_FACTORS
+    of them, and the directions compared on every bar at once.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    brick_sizes = np.multiply.outer(
+        np.asarray(brick_size_factors, dtype=float), np.asarray(atr, dtype=np.float64)
+    )
+    if len(brick_sizes) >= RENKO_VECTOR_FACTORS:
+        renko_prices = _renko_prices_by_bar(closes, brick_sizes)
+    else:
+        renko_prices = np.array(
+            [_renko_prices(closes.tolist(), sizes.tolist()) for sizes in brick_sizes],
+            dtype=np.float64,
+        ).reshape(brick_sizes.shape)
+
+    first = np.broadcast_to(closes[:1], (len(brick_sizes), min(len(closes), 1)))
+    previous = np.concatenate([first, renko_prices[:, :-1]], axis=1)
+    up = closes >= previous + brick_sizes
+    down = ~up & (closes <= previous - brick_sizes)
+    return renko_prices, up.astype(np.int64) - down
+
+
+def _renko_prices(closes: list, brick_sizes: list) -> list:
+    last = closes[0] if closes else 0.0
+    prices = []
+    for price, brick_size in zip(closes, brick_sizes):
+        if price >= last + brick_size:
+            last += brick_size
+        elif price <= last - brick_size:
+            last -= brick_size
+        prices.append(last)
+    return prices
+
+
+def _renko_prices_by_bar(closes: np.ndarray, brick_sizes: np.ndarray) -> np.ndarray:
+    sizes = np.ascontiguousarray(brick_sizes.T)
+    prices = np.empty_like(sizes)
+    last = np.full(sizes.shape[1], closes[0] if len(closes) else 0.0)
+    upper, lower = np.empty_like(last), np.empty_like(last)
+    up, down = np.empty(len(last), dtype=bool), np.empty(len(last), dtype=bool)
+    for price, size, row in zip(closes.tolist(), sizes, prices):
+        np.add(last, size, out=upper)
+        np.subtract(last, size, out=lower)
+        np.greater_equal(price, upper, out=up)
+        np.less_equal(price, lower, out=down)
+        # with a brick size of 0 both hold and lower equals upper
+        np.copyto(last, upper, where=up)
+        np.copyto(last, lower, where=down)
+        row[:] = last
+    return prices.T
+
+
+@indicator
+@cached_indicator("High", "Low", "Close")
 def compute_renko(df: pl.DataFrame, span_atr: int, brick_size_factor: float):
     df = compute_atr(df, span=span_atr)
-    df_pd = df.to_pandas()
-
-    prices = df_pd["Close"].tolist()
-
-    brick_sizes = df_pd["ATR"] * brick_size_factor
-
-    renko_directions = []  # +1 pour une brique montante, -1 pour une brique descendante
-    renko_prices = []
-
-    current_price = prices[0]
-    last_brick = current_price
-
-    for i, price in enumerate(prices):
-        brick_size = brick_sizes[i]
-        renko_direction = 0
-        if price >= last_brick + brick_size:
-            last_brick += brick_size
-            renko_direction = 1
-        elif price <= last_brick - brick_size:
-            last_brick -= brick_size
-            renko_direction = -1
+    renko_prices, renko_directions = renko_bricks(
+        df["Close"].to_numpy(), df["ATR"].to_numpy(), [brick_size_factor]
+    )
+    return df.with_columns(
+        pl.Series("Renko_Price", renko_prices[0]),
+        pl.Series("Direction", renko_directions[0]),
+    )
 
-        renko_prices.append(last_brick)
-        renko_directions.append(renko_direction)
 
-    df_pd["Renko_Price"] = renko_prices
-    df_pd["Direction"] = renko_directions
+def compute_renko_bricks(
+    df: pl.DataFrame, span_atr: int, brick_size_factors
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    renko_bricks of every brick size factor over the ATR of span_atr, each
+    factor being stored in the indicator cache as if computed by
+    compute_renko, so the backtesters built on the same data read it
+    """
+    factors = list(dict.fromkeys(brick_size_factors))
+    df_atr = compute_atr(df, span=span_atr)
+    renko_prices, renko_directions = renko_bricks(
+        df_atr["Close"].to_numpy(), df_atr["ATR"].to_numpy(), factors
+    )
 
-    return pl.from_pandas(df_pd)
+    for factor, prices, directions in zip(factors, renko_prices, renko_directions):
+        key = compute_renko.cache_key(df, span_atr, factor)
+        if key is not None:
+            columns = [
+                df_atr["ATR"],
+                pl.Series("Renko_Price", prices),
+                pl.Series("Direction", directions),
+            ]
+            indicator_cache.put(key, compact_columns(columns))
+    return renko_prices, renko_directions
 
 
+@indicator
+@cached_indicator("RSI")
 def compute_hma_on_rsi(df_in: pl.DataFrame, span=9) -> pl.DataFrame:
-    df = df_in.to_pandas()
-    wma_half = weighted_moving_average(df["RSI"], span // 2)
-    wma_full = weighted_moving_average(df["RSI"], span)
-    df["data_hull"] = 2 * wma_half - wma_full
-    df[get_ma_names(span, prefix="hma", suffix="_on_RSI")] = [
-        int(i) if not np.isnan(i) else 0
-        for i in weighted_moving_average(df["data_hull"], int(np.sqrt(span)))
-    ]
-    return pl.from_pandas(df)
+    name = get_ma_names(span, prefix="hma", suffix="_on_RSI")
+    return df_in.with_columns(**_hull_columns(df_in["RSI"], "hma", span, name))
 
 
+@indicator
+@cached_indicator("RSI")
 def compute_ema_on_rsi(df_in: pl.DataFrame, span=9) -> pl.DataFrame:
-    df = df_in.to_pandas()
+    df = to_pandas(df_in)
     ema = df["RSI"].ewm(span=span, adjust=False).mean()
     df[get_ma_names(span, prefix="ema", suffix="_on_RSI")] = ema
-    return pl.from_pandas(df)
+    return from_pandas(df)
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """
+    A compute_* call a strategy needs, function(df, **params), as a value
+    equal for the same function and params
+    """
+
+    function: Callable
+    params: Tuple[Tuple[str, Any], ...] = ()
+
+    def __call__(self, df: pl.DataFrame) -> pl.DataFrame:
+        return self.function(df, **dict(self.params))
+
+
+def indicator_spec(function: Callable, **params) -> IndicatorSpec:
+    """
+    IndicatorSpec of function(df, **params), the defaults filled in
+    """
+    arguments = inspect.signature(function).bind(None, **params)
+    arguments.apply_defaults()
+    return IndicatorSpec(function, tuple(arguments.arguments.items())[1:])
+
+
+# the compute_* functions whose columns are polars expressions of their params
+INDICATOR_EXPRESSIONS: Dict[Callable, Callable[..., Dict[str, pl.Expr]]] = {
+    compute_ema: functools.partial(_moving_average_columns, "ema"),
+    compute_vwma: functools.partial(_moving_average_columns, "vwma"),
+    compute_atr: lambda span: {"ATR": _average_true_range(span)},
+    compute_keltner_low: lambda span, window_ATR: {
+        "keltner_low": _keltner_channel(span, window_ATR, -2)
+    },
+    compute_keltner_high: lambda span, window_ATR: {
+        "keltner_high": _keltner_channel(span, window_ATR, 2)
+    },
+    compute_BB: _bollinger_bands,
+}
+
+
+def precompute_indicators(df: pl.DataFrame, specs) -> None:
+    """
+    Stores the columns of every spec in the indicator cache, the specs of
+    all the strategies and params of a run being merged. Duplicates are
+    computed once, the INDICATOR_EXPRESSIONS in a single lazy pass where
+    polars evaluates the intermediates they share (ATR, EMAs, rolling means)
+    once, the hulls through compute_mas sharing their prefix sums, and the
+    other indicators one by one.
+    """
+    expressions = {}
+    hull_spans: Dict[str, list] = {}
+    for spec in dict.fromkeys(specs):
+        params = dict(spec.params)
+        key = spec.function.cache_key(df, **params)
+        if key is None:
+            continue
+        if spec.function in INDICATOR_EXPRESSIONS:
+            expressions[key] = INDICATOR_EXPRESSIONS[spec.function](**params)
+        elif spec.function in (compute_hma, compute_ehma):
+            ma_type = "hma" if spec.function is compute_hma else "ehma"
+            hull_spans.setdefault(ma_type, []).append(params["span"])
+        else:
+            spec(df)
+
+    wide = df.lazy().select(
+        expr.alias(f"{i}/{name}")
+        for i, exprs in enumerate(expressions.values())
+        for name, expr in exprs.items()
+    )
+    wide = wide.collect() if expressions else pl.DataFrame()
+    for i, (key, exprs) in enumerate(expressions.items()):
+        columns = [wide[f"{i}/{name}"].alias(name) for name in exprs]
+        indicator_cache.put(key, compact_columns(columns))
+
+    for ma_type, spans in hull_spans.items():
+        compute_mas(df, spans, ma_type)
+
+
+def apply_indicators(df: pl.DataFrame, specs) -> pl.DataFrame:
+    """
+    df with the columns of the specs, computed in order
+    """
+    for spec in specs:
+        df = spec(df)
+    return df
 
 
 def compute_line(x_1, x_2, y_1, y_2):
@@ -1,13 +1,25 @@
+from typing import List
+
+import numpy as np
 import polars as pl
 from polars import DataFrame
 
 from src.mtal.analysis import (
+    IndicatorSpec,
+    apply_indicators,
     compute_BB,
     compute_hma,
     compute_keltner_high,
     compute_keltner_low,
+    indicator_spec,
+)
+from src.mtal.backtesting.common import (
+    AbstractBacktest,
+    crossed_above,
+    crossed_below,
+    shifted,
 )
-from src.mtal.backtesting.common import AbstractBacktest
+from src.mtal.incremental import ATRState, BBState, EMAState
 from src.mtal.utils import get_ma_names
 
 
@@ -26,9 +38,32 @@ class Keltner(AbstractBacktest):
             cutoff_end=cutoff_end,
             params=self.extract_named_params(locals()),
         )
-        self.data = compute_keltner_low(self.data, span=span, window_ATR=window_ATR)
-        self.data = compute_keltner_high(self.data, span=span, window_ATR=window_ATR)
+        self.data = apply_indicators(self.data, self.indicators(span, window_ATR))
         self.trailing_stop = 0
+        self.ema_state = EMAState(span)
+        self.atr_state = ATRState(window_ATR)
+        self.previous_band = (np.nan, np.nan)
+
+    @classmethod
+    def indicators(cls, span, window_ATR) -> List[IndicatorSpec]:
+        return [
+            indicator_spec(compute_keltner_low, span=span, window_ATR=window_ATR),
+            indicator_spec(compute_keltner_high, span=span, window_ATR=window_ATR),
+        ]
+
+    def signals(self):
+        close = self.column("Close")
+        enter = crossed_above(close, self.column("keltner_high"))
+        return self.trailing_stop_signals(enter, "keltner_low", min_length=30)
+
+    def next_signals(self, bar):
+        ema = self.ema_state.update(bar["Close"])
+        atr = self.atr_state.update(bar["High"], bar["Low"], bar["Close"])
+        if self.streamed_bars < self.span:  # type: ignore
+            ema = np.nan
+        return self.trailing_stop_next_signals(
+            bar["Close"], ema + 2 * atr, ema - 2 * atr, min_length=30
+        )
 
     def is_enter(self, df: DataFrame):
         """
@@ -77,8 +112,25 @@ class BB(AbstractBacktest):
             cutoff_end=cutoff_end,
             params=self.extract_named_params(locals()),
         )
-        self.data = compute_BB(self.data, window=window, window_dev=window_dev)
+        self.data = apply_indicators(self.data, self.indicators(window, window_dev))
         self.trailing_stop = 0
+        self.bb_state = BBState(window, window_dev)
+        self.previous_band = (np.nan, np.nan)
+
+    @classmethod
+    def indicators(cls, window, window_dev) -> List[IndicatorSpec]:
+        return [indicator_spec(compute_BB, window=window, window_dev=window_dev)]
+
+    def signals(self):
+        close = self.column("Close")
+        enter = crossed_above(close, self.column("BB_hband"))
+        return self.trailing_stop_signals(enter, "BB_lband", min_length=30)
+
+    def next_signals(self, bar):
+        hband, _, lband = self.bb_state.update(bar["Close"])
+        return self.trailing_stop_next_signals(
+            bar["Close"], hband, lband, min_length=30
+        )
 
     def is_enter(self, df: DataFrame):
         """
@@ -127,9 +179,35 @@ class BB_silico_simple(AbstractBacktest):
             cutoff_end=cutoff_end,
             params=self.extract_named_params(locals()),
         )
-        self.data = compute_BB(self.data, window=window, window_dev=window_dev)
+        self.data = apply_indicators(self.data, self.indicators(window, window_dev))
         self.trailing_stop = 0
 
+    @classmethod
+    def indicators(cls, window, window_dev) -> List[IndicatorSpec]:
+        return [indicator_spec(compute_BB, window=window, window_dev=window_dev)]
+
+    def signals(self):
+        close = self.column("Close")
+        lband, mid, hband = (
+            self.column("BB_lband"),
+            self.column("BB_mid"),
+            self.column("BB_hband"),
+        )
+        enough_history = self.has_history(30)
+
+        enter = enough_history & (
+            crossed_above(close, lband)
+            | crossed_above(close, mid)
+            | crossed_above(close, hband)
+        )
+        # as in is_exit, only the previous bar is checked against the low band
+        exit = enough_history & (
+            crossed_below(close, hband)
+            | crossed_below(close, mid)
+            | (shifted(close) >= shifted(lband))
+        )
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open if the previous ema is a cross
@@ -236,12 +314,50 @@ class BB_silico(AbstractBacktest):
             cutoff_end=cutoff_end,
             params=self.extract_named_params(locals()),
         )
-        self.data = compute_BB(self.data, window=window, window_dev=window_dev)
-        self.data = compute_hma(self.data, short_ma)
-        self.data = compute_hma(self.data, mid_ma)
-        self.data = compute_hma(self.data, long_ma)
+        self.data = apply_indicators(
+            self.data,
+            self.indicators(short_ma, mid_ma, long_ma, window, window_dev),
+        )
         self.trailing_stop = 0
 
+    @classmethod
+    def indicators(
+        cls, short_ma, mid_ma, long_ma, window, window_dev
+    ) -> List[IndicatorSpec]:
+        return [
+            indicator_spec(compute_BB, window=window, window_dev=window_dev),
+            indicator_spec(compute_hma, span=short_ma),
+            indicator_spec(compute_hma, span=mid_ma),
+            indicator_spec(compute_hma, span=long_ma),
+        ]
+
+    def signals(self):
+        close = self.column("Close")
+        lband, mid, hband = (
+            self.column("BB_lband"),
+            self.column("BB_mid"),
+            self.column("BB_hband"),
+        )
+        ma_short = self.column(get_ma_names(self.short_ma, prefix="hma"))
+        ma_mid = self.column(get_ma_names(self.mid_ma, prefix="hma"))
+        ma_long = self.column(get_ma_names(self.long_ma, prefix="hma"))
+        uptrend = (ma_short > ma_mid) & (ma_mid > ma_long)
+        downtrend = (ma_short < ma_mid) & (ma_mid < ma_long)
+        enough_history = self.has_history(30)
+
+        enter = enough_history & (
+            crossed_above(close, lband)
+            | (uptrend & crossed_above(close, mid))
+            | crossed_above(close, hband)
+        )
+        # as in is_exit, only the previous bar is checked against the low band
+        exit = enough_history & (
+            crossed_below(close, hband)
+            | (downtrend & crossed_below(close, mid))
+            | (shifted(close) >= shifted(lband))
+        )
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open if the previous ema is a cross
@@ -0,0 +1,243 @@
+from itertools import product
+from typing import Dict, Type
+
+import numpy as np
+import polars as pl
+
+from src.mtal.analysis import compute_ma_matrix
+from src.mtal.backtesting.common import AbstractBacktest
+from src.mtal.backtesting.ma_cross_backtest import MACrossBacktester
+
+# (short_ma, long_ma) pairs accounted at once by ma_cross_sweep
+SWEEP_BLOCK = 512
+
+
+def batch_backtest(
+    panel: pl.DataFrame,
+    backtester_class: Type[AbstractBacktest],
+    params: dict = {},
+    pair_column="Pair",
+) -> pl.DataFrame:
+    """
+    Runs backtester_class with the same params on every pair of a long panel
+    (pair, time, OHLCV), the rows of each pair in time order. Closes and
+    signals are laid out in an assets x bars matrix, each pair starting at
+    column 0, and the position and pnl accounting is done for all the pairs at
+    once. The signals come from backtester_class.panel_signals over the whole
+    panel when it has them, else from the signals() of a backtester per pair.
+    Returns one row of BacktestResults scalars per pair.
+    """
+    names = panel[pair_column].unique(maintain_order=True)
+    # each pair as its index in names, the windows over pairs hashing integers
+    coded = panel.with_columns(
+        pl.col(pair_column).replace(names, range(len(names)), return_dtype=pl.Int64)
+    )
+    rows = coded[pair_column].to_numpy()
+    columns = coded.select(pl.int_range(pl.len()).over(pair_column)).to_series()
+    columns = columns.to_numpy()
+    lengths = np.bincount(rows, minlength=len(names))
+    # cash, fees and cutoffs are the same for every pair
+    reference = backtester_class(panel.filter(pl.Series(rows == 0)), **params)
+    cutoff_begin = reference.cutoff_begin
+    if params.get("cutoff_end") is None:
+        cutoff_end = lengths - 1
+    else:
+        cutoff_end = np.full(len(names), reference.cutoff_end)
+
+    assets, bars = len(names), lengths.max()
+    close = np.ones((assets, bars))
+    close[rows, columns] = panel["Close"].to_numpy()
+    enter = np.zeros((assets, bars), dtype=bool)
+    exit = np.zeros((assets, bars), dtype=bool)
+
+    signals = backtester_class.panel_signals(coded, pair_column, **params)
+    if signals is not None:
+        enter[rows, columns], exit[rows, columns] = signals
+    else:
+        frames = panel.partition_by(pair_column, maintain_order=True)
+        for i, frame in enumerate(frames):
+            frame_signals = backtester_class(frame, **params).signals()
+            if frame_signals is None:
+                raise ValueError(
+                    f"{backtester_class.__name__} has no signals(), "
+                    "it cannot be batched"
+                )
+            enter[i, : lengths[i]], exit[i, : lengths[i]] = frame_signals
+
+    # same bars as the run loop, the last one closing any open position
+    bar = np.arange(bars)
+    active = (bar > cutoff_begin) & (bar < cutoff_end[:, None])
+    last_bar = np.maximum(cutoff_end - 1, cutoff_begin)
+    first, last = close[:, 0], close[np.arange(assets), lengths - 1]
+    buy_and_hold = (last - first) / first
+
+    metrics = _metrics(
+        close,
+        enter,
+        exit,
+        active,
+        last_bar,
+        buy_and_hold,
+        reference.cash,
+        reference.fees,
+    )
+    return pl.DataFrame({pair_column: names, **metrics})
+
+
+def ma_cross_sweep(
+    data: pl.DataFrame,
+    short_spans,
+    long_spans,
+    ma_type="ema",
+    cutoff_begin=None,
+    cutoff_end=None,
+) -> pl.DataFrame:
+    """
+    MACrossBacktester on data for every (short_ma, long_ma) of short_spans x
+    long_spans, one row of BacktestResults scalars per pair in the order of
+    product(short_spans, long_spans). The moving averages are the rows of a
+    single compute_ma_matrix, the crossovers of all the pairs are compared
+    from it by broadcasting, and the positions and pnl are accounted for
+    SWEEP_BLOCK pairs at once like batch_backtest.
+    """
+    short_spans, long_spans = list(short_spans), list(long_spans)
+    backtester = MACrossBacktester(
+        data, short_spans[0], long_spans[0], ma_type, cutoff_begin, cutoff_end
+    )
+    spans = list(dict.fromkeys(short_spans + long_spans))
+    mas = compute_ma_matrix(data, spans, ma_type)
+    short_mas = mas[[spans.index(span) for span in short_spans]]
+    long_mas = mas[[spans.index(span) for span in long_spans]]
+
+    bars = len(data)
+    enough_history = backtester.has_history(3)
+    active = np.zeros(bars, dtype=bool)
+    active[backtester.cutoff_begin + 1 : backtester.cutoff_end] = True
+    last_bar = max(backtester.cutoff_end - 1, backtester.cutoff_begin)
+
+    blocks = []
+    shorts = max(1, SWEEP_BLOCK // len(long_spans))
+    for start in range(0, len(short_spans), shorts):
+        fast = short_mas[start : start + shorts, None, :]
+        slow = long_mas[None, :, :]
+        # crossed_above and crossed_below of every pair of the block
+        enter = np.zeros(np.broadcast_shapes(fast.shape, slow.shape), dtype=bool)
+        exit = np.zeros_like(enter)
+        enter[..., 1:] = (fast > slow)[..., 1:] & (fast <= slow)[..., :-1]
+        exit[..., 1:] = (fast < slow)[..., 1:] & (fast >= slow)[..., :-1]
+        enter = enter.reshape(-1, bars) & enough_history
+        exit = exit.reshape(-1, bars) & enough_history
+
+        blocks.append(
+            _metrics(
+                backtester.column("Close")[None, :],
+                enter,
+                exit,
+                np.broadcast_to(active, enter.shape),
+                np.full(len(enter), last_bar),
+                backtester.get_buy_and_hold_return(),
+                backtester.cash,
+                backtester.fees,
+            )
+        )
+
+    pairs = np.array(list(product(short_spans, long_spans))).reshape(-1, 2)
+    return pl.DataFrame(
+        {
+            "short_ma": pairs[:, 0],
+            "long_ma": pairs[:, 1],
+            **{name: np.concatenate([b[name] for b in blocks]) for name in blocks[0]},
+        }
+    )
+
+
+def _metrics(
+    close: np.ndarray,
+    enter: np.ndarray,
+    exit: np.ndarray,
+    active: np.ndarray,
+    last_bar: np.ndarray,
+    buy_and_hold,
+    cash: float,
+    fees: float,
+) -> Dict[str, np.ndarray]:
+    """
+    The BacktestResults scalars of each row of the rows x bars signals,
+    positions and pnl being accounted for all the rows at once. close is
+    rows x bars or the 1 x bars closes shared by every row.
+    """
+    close = np.broadcast_to(close, enter.shape)
+    bars = enter.shape[1]
+    position = _positions(enter, exit, active)
+    previous = np.zeros_like(position)
+    previous[:, 1:] = position[:, :-1]
+
+    rows = np.arange(len(enter))
+    closing = previous & ~position
+    closing[rows, last_bar] |= position[rows, last_bar]
+
+    entry_bar = np.where(position & ~previous, np.arange(bars), 0)
+    entry_price = np.take_along_axis(
+        close, np.maximum.accumulate(entry_bar, axis=1), axis=1
+    )
+    variation = (close - entry_price) / entry_price
+
+    profit_pct = np.where(closing, variation - 2 * fees / 100, np.nan)
+
+    growth = np.where(closing, 1 + profit_pct, 1.0)
+    final_cash = np.cumprod(
+        np.concatenate([np.full((len(enter), 1), float(cash)), growth], axis=1), axis=1
+    )[:, -1]
+    pnl = final_cash - cash
+
+    trade_number = closing.sum(axis=1)
+    has_trades = trade_number > 0
+    safe_trades = np.maximum(trade_number, 1)
+    win_rate = np.where(
+        has_trades, (closing & (variation > 0)).sum(axis=1) / safe_trades, 0
+    )
+
+    wins = np.where(profit_pct > 0, profit_pct, np.nan)
+    losses = np.where(profit_pct < 0, profit_pct, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average_win = np.nan_to_num(np.nanmean(wins, axis=1))
+        average_loss = np.abs(np.nan_to_num(np.nanmean(losses, axis=1)))
+        kelly_criterion = np.where(
+            average_win == 0,
+            0,
+            np.where(
+                average_loss == 0,
+                100,
+                win_rate / average_loss - (1 - win_rate) / average_win,
+            ),
+        )
+
+    return {
+        "pnl": pnl,
+        "normalized_pnl": np.where(has_trades, pnl / safe_trades, 0),
+        "pnl_percentage": pnl / cash,
+        "max_drawdown": np.where(
+            has_trades, np.where(closing, profit_pct, np.inf).min(axis=1), 0
+        ),
+        "win_rate": win_rate,
+        "average_return": np.where(
+            has_trades, np.nansum(profit_pct, axis=1) / safe_trades, 0
+        ),
+        "trade_number": trade_number,
+        "excess_return_vs_buy_and_hold": (pnl - buy_and_hold * cash) / cash,
+        "kelly_criterion": kelly_criterion,
+    }
+
+
+def _positions(enter: np.ndarray, exit: np.ndarray, active: np.ndarray) -> np.ndarray:
+    """
+    Position held after each bar, for every asset at once: a flat asset enters
+    on its entry signal, an invested one leaves on its exit signal
+    """
+    position = np.zeros_like(enter)
+    current = np.zeros(len(enter), dtype=bool)
+    for bar in range(enter.shape[1]):
+        moved = np.where(current, ~exit[:, bar], enter[:, bar])
+        current = np.where(active[:, bar], moved, current)
+        position[:, bar] = current
+    return position
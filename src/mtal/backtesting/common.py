@@ -1,28 +1,451 @@
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from collections import OrderedDict
+from itertools import product
+from typing import Callable, Hashable, List, Optional, Tuple, Union
 
+import numpy as np
+import polars as pl
 from pandas import DataFrame
 
+from src.mtal.analysis import IndicatorSpec, precompute_indicators
+from src.mtal.cache import fingerprint
+from src.mtal.profiling import BacktestStats, count, current_stats
 
-@dataclass
-class BacktestResults:
-    pnl: float
-    normalized_pnl: float
-    pnl_percentage: float
-    max_drawdown: float
-    win_rate: float
-    average_return: float
-    trade_number: float
-    entry_dates: list
-    exit_dates: list
-    entry_prices: list
-    exit_prices: list
-    profit_pct_history: list
-    profit_history: list
-    value_history: list
-    b_n_h_history: list
-    excess_return_vs_buy_and_hold: float
-    kelly_criterion: float
+
+class _Metrics:
+    __slots__ = ()
+
+    METRICS = (
+        "pnl",
+        "normalized_pnl",
+        "pnl_percentage",
+        "max_drawdown",
+        "win_rate",
+        "average_return",
+        "trade_number",
+        "excess_return_vs_buy_and_hold",
+        "kelly_criterion",
+    )
+
+    def __repr__(self):
+        metrics = ", ".join(f"{name}={getattr(self, name)}" for name in self.METRICS)
+        return f"{type(self).__name__}({metrics})"
+
+    def metrics(self) -> dict:
+        return {name: getattr(self, name) for name in self.METRICS}
+
+
+class BacktestMetrics(_Metrics):
+    """
+    Scalar metrics of a run kept as running aggregates, updated once per
+    closed trade, without any history
+    """
+
+    __slots__ = (
+        "cash",
+        "final_cash",
+        "buy_and_hold_return",
+        "trade_number",
+        "wins",
+        "profit_pct_sum",
+        "worst_profit_pct",
+        "gain_sum",
+        "gain_count",
+        "loss_sum",
+        "loss_count",
+    )
+
+    def __init__(self, cash: float, buy_and_hold_return: float = 0) -> None:
+        self.cash = cash
+        self.final_cash = cash
+        self.buy_and_hold_return = buy_and_hold_return
+        self.trade_number = 0
+        self.wins = 0
+        self.profit_pct_sum = 0
+        self.worst_profit_pct = 0
+        self.gain_sum, self.gain_count = 0, 0
+        self.loss_sum, self.loss_count = 0, 0
+
+    def add_trade(self, variation: float, profit_pct: float) -> None:
+        if not self.trade_number or profit_pct < self.worst_profit_pct:
+            self.worst_profit_pct = profit_pct
+        self.trade_number += 1
+        self.wins += variation > 0
+        self.final_cash = (1 + profit_pct) * self.final_cash
+        self.profit_pct_sum += profit_pct
+        if profit_pct > 0:
+            self.gain_sum += profit_pct
+            self.gain_count += 1
+        elif profit_pct < 0:
+            self.loss_sum += profit_pct
+            self.loss_count += 1
+
+    @property
+    def pnl(self) -> float:
+        return self.final_cash - self.cash
+
+    @property
+    def pnl_percentage(self) -> float:
+        return self.pnl / self.cash
+
+    @property
+    def normalized_pnl(self) -> float:
+        return self.pnl / self.trade_number if self.trade_number else 0
+
+    @property
+    def max_drawdown(self) -> float:
+        return self.worst_profit_pct
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.trade_number if self.trade_number else 0
+
+    @property
+    def average_return(self) -> float:
+        return self.profit_pct_sum / self.trade_number if self.trade_number else 0
+
+    @property
+    def excess_return_vs_buy_and_hold(self) -> float:
+        buy_and_hold_perf = self.buy_and_hold_return * self.cash
+        return (self.pnl - buy_and_hold_perf) / self.cash
+
+    @property
+    def kelly_criterion(self) -> float:
+        G = self.gain_sum / self.gain_count if self.gain_count else 0
+        V = abs(self.loss_sum / self.loss_count) if self.loss_count else 0
+
+        if G == 0:
+            return 0
+        elif V == 0:
+            return 100
+        else:
+            return (self.win_rate / V) - ((1 - self.win_rate) / G)
+
+    def to_dict(self) -> dict:
+        """
+        The running aggregates as plain numbers, from_dict giving back the
+        same metrics
+        """
+        state = {name: getattr(self, name) for name in self.__slots__}
+        return {
+            name: value.item() if isinstance(value, np.generic) else value
+            for name, value in state.items()
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "BacktestMetrics":
+        metrics = cls.__new__(cls)
+        for name, value in state.items():
+            setattr(metrics, name, value)
+        return metrics
+
+
+class BacktestResults(_Metrics):
+    """
+    Trades of a run as bar indices in closes, the Close values of the bars
+    cutoff_begin to cutoff_end - 1. A trade holds the bars entry_bar <= bar <
+    exit_bar, exit_bar being len(closes) when the position is closed at the end
+    of the run. Prices, value curves and scalar metrics are derived on access.
+    source identifies closes, as (fingerprint of Close, cutoff_begin,
+    cutoff_end) of the run, for the buy and hold curve cache.
+    """
+
+    __slots__ = (
+        "cash",
+        "fees",
+        "buy_and_hold_return",
+        "closes",
+        "entry_bars",
+        "exit_bars",
+        "entry_dates",
+        "exit_dates",
+        "source",
+    )
+
+    def __init__(
+        self,
+        cash: float,
+        fees: float,
+        buy_and_hold_return: float,
+        closes: np.ndarray,
+        entry_bars: np.ndarray,
+        exit_bars: np.ndarray,
+        entry_dates: np.ndarray,
+        exit_dates: np.ndarray,
+        source: Optional[Hashable] = None,
+    ) -> None:
+        self.cash = cash
+        self.fees = fees
+        self.buy_and_hold_return = buy_and_hold_return
+        self.closes = closes
+        self.entry_bars = entry_bars
+        self.exit_bars = exit_bars
+        self.entry_dates = entry_dates
+        self.exit_dates = exit_dates
+        self.source = source
+
+    @property
+    def entry_prices(self) -> np.ndarray:
+        return self.closes[self.entry_bars]
+
+    @property
+    def exit_prices(self) -> np.ndarray:
+        return self.closes[np.minimum(self.exit_bars, len(self.closes) - 1)]
+
+    @property
+    def profit_pct_history(self) -> np.ndarray:
+        entry_prices = self.entry_prices
+        variation = (self.exit_prices - entry_prices) / entry_prices
+        return variation - 2 * self.fees / 100
+
+    @property
+    def cash_history(self) -> np.ndarray:
+        return np.cumprod(np.concatenate([[self.cash], 1 + self.profit_pct_history]))
+
+    @property
+    def profit_history(self) -> np.ndarray:
+        return self.profit_pct_history * self.cash_history[:-1]
+
+    @property
+    def value_history(self) -> np.ndarray:
+        bars = np.arange(1, len(self.closes))
+        cash_history = self.cash_history
+        closed = np.searchsorted(self.exit_bars, bars, side="right")
+        if not self.trade_number:
+            values = np.full(len(bars), cash_history[0])
+        else:
+            trade = np.searchsorted(self.entry_bars, bars, side="right") - 1
+            entry_price = self.entry_prices[np.maximum(trade, 0)]
+            variation = (self.closes[bars] - entry_price) / entry_price
+            values = np.where(
+                trade >= closed,
+                (1 + variation) * cash_history[np.maximum(trade, 0)],
+                cash_history[closed],
+            )
+        return np.concatenate([[self.cash, self.cash], values])
+
+    @property
+    def b_n_h_history(self) -> np.ndarray:
+        return buy_and_hold_curve(self.closes, self.cash, self.source)
+
+    @property
+    def trade_number(self) -> int:
+        return len(self.entry_bars)
+
+    @property
+    def pnl(self) -> float:
+        return float(self.cash_history[-1]) - self.cash
+
+    @property
+    def pnl_percentage(self) -> float:
+        return self.pnl / self.cash
+
+    @property
+    def normalized_pnl(self) -> float:
+        return self.pnl / self.trade_number if self.trade_number else 0
+
+    @property
+    def max_drawdown(self) -> float:
+        return float(self.profit_pct_history.min()) if self.trade_number else 0
+
+    @property
+    def win_rate(self) -> float:
+        if not self.trade_number:
+            return 0
+        entry_prices = self.entry_prices
+        variation = (self.exit_prices - entry_prices) / entry_prices
+        return int((variation > 0).sum()) / self.trade_number
+
+    @property
+    def average_return(self) -> float:
+        if not self.trade_number:
+            return 0
+        return sum(self.profit_pct_history.tolist()) / self.trade_number
+
+    @property
+    def excess_return_vs_buy_and_hold(self) -> float:
+        buy_and_hold_perf = self.buy_and_hold_return * self.cash
+        return (self.pnl - buy_and_hold_perf) / self.cash
+
+    @property
+    def kelly_criterion(self) -> float:
+        return compute_kelly_criterion(self.win_rate, self.profit_pct_history.tolist())
+
+
+_buy_and_hold_curves: OrderedDict = OrderedDict()
+BUY_AND_HOLD_CACHE_SIZE = 32
+
+
+def buy_and_hold_curve(
+    closes: np.ndarray, cash: float, source: Optional[Hashable] = None
+) -> np.ndarray:
+    """
+    Value of cash bought at closes[0] and held, starting with [cash, cash] like
+    the run histories, as a read-only array. Cached on source, which
+    identifies closes, so every run on the same data and cutoff window shares
+    one curve.
+    """
+    key = (source, cash)
+    if source is not None and key in _buy_and_hold_curves:
+        _buy_and_hold_curves.move_to_end(key)
+        return _buy_and_hold_curves[key]
+
+    closes = np.asarray(closes, dtype=np.float64)
+    variation = np.diff(closes) / closes[:-1]
+    curve = np.cumprod(np.concatenate([[cash, 1.0], 1 + variation]))
+    curve.flags.writeable = False
+    if source is None:
+        return curve
+
+    _buy_and_hold_curves[key] = curve
+    if len(_buy_and_hold_curves) > BUY_AND_HOLD_CACHE_SIZE:
+        _buy_and_hold_curves.popitem(last=False)
+    return curve
+
+
+def compute_kelly_criterion(win_rate: float, profit_pct_history: list) -> float:
+    wins = list(filter(lambda x: x > 0, profit_pct_history))
+    losses = list(filter(lambda x: x < 0, profit_pct_history))
+
+    if wins:
+        G = sum(wins) / len(wins)
+    else:
+        G = 0
+
+    if losses:
+        V = abs(sum(losses) / len(losses))
+    else:
+        V = 0
+
+    if G == 0:
+        return 0
+    elif V == 0:
+        return 100
+    else:
+        return (win_rate / V) - ((1 - win_rate) / G)
+
+
+def shifted(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    result = np.full(len(values), np.nan)
+    if periods < len(values):
+        result[periods:] = values[: len(values) - periods]
+    return result
+
+
+def crossed_above(fast: np.ndarray, slow: np.ndarray) -> np.ndarray:
+    """
+    fast > slow on the bar while fast <= slow on the previous one
+    """
+    fast, slow = np.broadcast_arrays(fast, slow)
+    return (fast > slow) & (shifted(fast) <= shifted(slow))
+
+
+def crossed_below(fast: np.ndarray, slow: np.ndarray) -> np.ndarray:
+    """
+    fast < slow on the bar while fast >= slow on the previous one
+    """
+    fast, slow = np.broadcast_arrays(fast, slow)
+    return (fast < slow) & (shifted(fast) >= shifted(slow))
+
+
+def trailing_stop_scan(
+    enter: np.ndarray,
+    exit_active: np.ndarray,
+    stop_level: np.ndarray,
+    close: np.ndarray,
+    first: int,
+    end: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    One pass over bars first..end - 1 of a position whose stop follows the
+    running max of stop_level and is reset to 0 when close goes below it.
+    As in the run loop, the stop is only updated on bars where exit_active is
+    set and that are not an entry, whether a position is open or not.
+    Returns the executed entries, the executed exits and the stop after each bar.
+    """
+    entries = np.zeros(len(close), dtype=bool)
+    exits = np.zeros(len(close), dtype=bool)
+    stops = np.zeros(len(close))
+    enter, exit_active = enter.tolist(), exit_active.tolist()
+    stop_level, close = stop_level.tolist(), close.tolist()
+
+    in_position = False
+    stop = 0
+    for i in range(first, end):
+        if enter[i] and not in_position:
+            entries[i] = in_position = True
+        elif exit_active[i]:
+            if stop_level[i] > stop:
+                stop = stop_level[i]
+            if close[i] < stop:
+                stop = 0
+                if in_position:
+                    exits[i], in_position = True, False
+        stops[i] = stop
+    return entries, exits, stops
+
+
+class BarCursor:
+    """
+    Window data[begin:end] answering the df[-1, "col"] indexing of
+    is_enter/is_exit from numpy columns, extracted once on first access and
+    shared by every window of the same data
+    """
+
+    def __init__(self, data: pl.DataFrame, begin=0, end=None, columns=None):
+        self.data = data
+        self.begin = begin
+        self.end = len(data) if end is None else end
+        self._columns = {} if columns is None else columns
+        count("slices")
+
+    def __len__(self):
+        return self.end - self.begin
+
+    @property
+    def columns(self):
+        return self.data.columns
+
+    def until(self, last: int) -> "BarCursor":
+        """
+        Moves the end of the window so that last is its final bar
+        """
+        self.end = last + 1
+        return self
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = self.data[name].to_numpy()
+        return self._columns[name]
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, name = key
+            if isinstance(rows, slice):
+                window = self._window(rows)
+                return self.column(name)[window.begin : window.end]
+            return self.column(name)[self._position(rows)]
+        if isinstance(key, str):
+            return self.column(key)[self.begin : self.end]
+        if isinstance(key, slice):
+            return self._window(key)
+        position = self._position(key)
+        return BarCursor(self.data, position, position + 1, self._columns)
+
+    def _position(self, row: int) -> int:
+        position = self.end + row if row < 0 else self.begin + row
+        if not self.begin <= position < self.end:
+            raise IndexError(f"row {row} out of bounds for a window of {len(self)}")
+        return position
+
+    def _window(self, rows: slice) -> "BarCursor":
+        start, stop, step = rows.indices(len(self))
+        if step != 1:
+            raise ValueError("Only contiguous windows are supported")
+        return BarCursor(
+            self.data, self.begin + start, self.begin + max(start, stop), self._columns
+        )
 
 
 class AbstractBacktest(ABC):
@@ -42,21 +465,63 @@ class AbstractBacktest(ABC):
 
         self.cash = cash
         self.current_bet = 0
-        self.wins = 0
-        self.losses = 0
-        self.cash_history = [cash]
-        self.entry_dates = []
-        self.exit_dates = []
-        self.entry_prices = []
-        self.exit_prices = []
-        self.profit_pct_history = []
-        self.profit_history = []
-        self.value_history = [cash, cash]
-        self.b_n_h_history = [cash, cash]
+        self.entry_price = None
+        self.running_metrics = BacktestMetrics(cash)
+        self.entry_bars = []
+        self.exit_bars = []
+        self.record_trades = True
+        self.streamed_bars = 0
         self.fees = fees
         for key, value in params.items():
             setattr(self, key, value)
 
+    @classmethod
+    def indicators(cls, **params) -> List[IndicatorSpec]:
+        """
+        The indicators a backtester built with params reads, for precompute
+        """
+        return []
+
+    @classmethod
+    def precompute(cls, data: pl.DataFrame, ranges: dict):
+        """
+        Computes the indicators of all the combinations of ranges at once in
+        the indicator cache
+        """
+        cls._precompute_specs(
+            data, [dict(zip(ranges, values)) for values in product(*ranges.values())]
+        )
+
+    @classmethod
+    def precompute_combinations(
+        cls, data: pl.DataFrame, param_combinations: List[dict]
+    ):
+        """
+        Called by train_strategy before running param_combinations, to compute
+        the indicators of only those. The precompute overrides take the values
+        of each param apart, not their product, so they get these values.
+        """
+        overridden = cls.precompute.__func__ is not AbstractBacktest.precompute.__func__
+        if param_combinations and overridden:
+            cls.precompute(
+                data,
+                {
+                    key: list(
+                        dict.fromkeys(params[key] for params in param_combinations)
+                    )
+                    for key in param_combinations[0]
+                },
+            )
+        else:
+            cls._precompute_specs(data, param_combinations)
+
+    @classmethod
+    def _precompute_specs(cls, data: pl.DataFrame, param_combinations: List[dict]):
+        specs = dict.fromkeys(
+            spec for params in param_combinations for spec in cls.indicators(**params)
+        )
+        precompute_indicators(data, specs)
+
     def extract_named_params(self, params):
         del params["self"]
         del params["data"]
@@ -64,132 +529,250 @@ class AbstractBacktest(ABC):
         del params["cutoff_end"]
         return params
 
-    def run(self) -> BacktestResults:
-        for i in range(self.cutoff_begin + 2, self.cutoff_end + 1):
-            current_df = self.data[self.cutoff_begin : i]
-            if self.is_enter(current_df) and self.current_bet == 0:
-                self._entering_update(current_df)
-            elif self.is_exit(current_df) and self.current_bet != 0:
-                self._exiting_update(current_df)
-            variation_entry = self.get_variation_to_date(current_df)
-            variation_yesterday = (
-                current_df[-1, "Close"] - current_df[-2, "Close"]
-            ) / current_df[-2, "Close"]
-            self.value_history.append(
-                self.cash + (1 + variation_entry) * self.current_bet
+    def run(self, mode="full") -> Union[BacktestResults, BacktestMetrics]:
+        """
+        mode="metrics" only keeps the running aggregates of the trades and
+        returns their BacktestMetrics, for optimisation loops
+        """
+        if mode not in ("full", "metrics"):
+            raise ValueError(f"Unknown run mode {mode}, expected full or metrics")
+        self.record_trades = mode == "full"
+
+        stats = current_stats()
+        if stats is None:
+            return self._run()
+
+        start, signal_time = time.perf_counter(), stats.signal_time
+        results = self._run(stats)
+        stats.runs += 1
+        stats.bars += max(self.cutoff_end - self.cutoff_begin - 1, 0)
+        stats.bookkeeping_time += (
+            time.perf_counter() - start - (stats.signal_time - signal_time)
+        )
+        return results
+
+    def _run(
+        self, stats: Optional[BacktestStats] = None
+    ) -> Union[BacktestResults, BacktestMetrics]:
+        closes = self.column("Close")
+        if stats is None:
+            signals = self.signals()
+        else:
+            signals = stats.timed("signal_time", self.signals)()
+
+        if signals is None:
+            cursor = BarCursor(self.data, begin=self.cutoff_begin)
+
+            def is_enter(last):
+                return self.is_enter(cursor.until(last))
+
+            def is_exit(last):
+                return self.is_exit(cursor.until(last))
+
+            if stats is not None:
+                is_enter = stats.timed("signal_time", is_enter)
+                is_exit = stats.timed("signal_time", is_exit)
+            self._run_bars(
+                closes.tolist(),
+                range(self.cutoff_begin + 1, self.cutoff_end),
+                is_enter,
+                is_exit,
             )
-            self.b_n_h_history.append(
-                self.b_n_h_history[-1] * (1 + variation_yesterday)
+        else:
+            enter, exit = signals
+            window = slice(self.cutoff_begin + 1, self.cutoff_end)
+            # nothing happens on the bars without any signal
+            bars = np.flatnonzero(enter[window] | exit[window]) + window.start
+            self._run_bars(
+                closes.tolist(),
+                bars.tolist(),
+                enter.tolist().__getitem__,
+                exit.tolist().__getitem__,
             )
 
-        if self.cash == 0:
-            self._exiting_update(current_df)
-
-        pnl_percentage = (self.cash - self.cash_history[0]) / self.cash_history[0]
+        self.running_metrics.buy_and_hold_return = self.get_buy_and_hold_return()
+        if not self.record_trades:
+            return self.running_metrics
 
-        max_drawdown = min(self.profit_pct_history) if self.profit_pct_history else 0
-        win_rate = (
-            self.wins / (self.wins + self.losses) if self.profit_pct_history else 0
-        )
-        average_return = (
-            sum(self.profit_pct_history) / len(self.profit_pct_history)
-            if self.profit_pct_history
-            else 0
-        )
-        pnl = self.cash - self.cash_history[0]
-        normalized_pnl = (
-            pnl / len(self.profit_pct_history) if self.profit_pct_history else 0
+        dates = self.data["Close Time"]
+        if dates.dtype == pl.Date:
+            # trade dates have always been datetimes, as from the pandas round trip
+            dates = dates.cast(pl.Datetime("ms"))
+        elif dates.dtype.is_integer():
+            dates = pl.from_epoch(dates, time_unit="ms")
+        last_bar = max(self.cutoff_end - 1, self.cutoff_begin)
+        return BacktestResults(
+            cash=self.running_metrics.cash,
+            fees=self.fees,
+            buy_and_hold_return=self.get_buy_and_hold_return(),
+            closes=closes[self.cutoff_begin : self.cutoff_end],
+            entry_bars=np.array(self.entry_bars, dtype=int) - self.cutoff_begin,
+            exit_bars=np.array(self.exit_bars, dtype=int) - self.cutoff_begin,
+            entry_dates=dates.gather(self.entry_bars).to_numpy(),
+            exit_dates=dates.gather(np.minimum(self.exit_bars, last_bar)).to_numpy(),
+            source=(
+                fingerprint(self.data, ["Close"]),
+                self.cutoff_begin,
+                self.cutoff_end,
+            ),
         )
 
-        results = BacktestResults(
-            pnl=self.cash - self.cash_history[0],
-            pnl_percentage=pnl_percentage,
-            max_drawdown=max_drawdown,
-            win_rate=win_rate,
-            average_return=average_return,
-            trade_number=len(self.profit_pct_history),
-            entry_dates=self.entry_dates,
-            exit_dates=self.exit_dates,
-            entry_prices=self.entry_prices,
-            exit_prices=self.exit_prices,
-            profit_pct_history=self.profit_pct_history,
-            profit_history=self.profit_history,
-            normalized_pnl=normalized_pnl,
-            value_history=self.value_history,
-            b_n_h_history=self.b_n_h_history,
-            excess_return_vs_buy_and_hold=self.get_excess_return_vs_buy_and_hold(pnl),
-            kelly_criterion=self.compute_kelly_criterion(
-                win_rate, self.profit_pct_history
-            ),
+    def on_bar(self, bar: dict) -> str:
+        """
+        Streaming counterpart of run for live klines: bar is a mapping with at
+        least the Close of the newly closed kline, and the other columns the
+        strategy reads (High and Low for the ATR). Updates the position and
+        returns "enter", "exit" or "hold". To follow a strategy live, feed
+        the history bar by bar first, then each new kline. Only the
+        strategies that support_streaming can be followed.
+        """
+        if not self.supports_streaming():
+            raise TypeError(
+                f"{type(self).__name__} has no incremental signals to stream, use run"
+            )
+        self.streamed_bars += 1
+        enter, exit = self.next_signals(bar)
+        bar_index, close = self.streamed_bars - 1, bar["Close"]
+
+        if enter and self.current_bet == 0:
+            self._entering_update(bar_index, close)
+            return "enter"
+        elif exit and self.current_bet != 0:
+            self._exiting_update(bar_index, close)
+            return "exit"
+        return "hold"
+
+    def supports_streaming(self) -> bool:
+        """
+        Whether the strategy computes next_signals with its params, for on_bar
+        """
+        return type(self).next_signals is not AbstractBacktest.next_signals
+
+    def next_signals(self, bar: dict) -> Tuple[bool, bool]:
+        """
+        is_enter/is_exit of the streamed bars, computed from incremental
+        indicator state in constant time. self.streamed_bars counts bar.
+        Overridden by the strategies that support streaming, on_bar rejects
+        the others before calling it.
+        """
+        raise NotImplementedError
+
+    def trailing_stop_next_signals(
+        self, close: float, band: float, stop_level: float, min_length: int
+    ) -> Tuple[bool, bool]:
+        """
+        next_signals of the strategies of trailing_stop_signals entering when
+        close crosses above band, with the same updates of self.trailing_stop.
+        self.previous_band holds the close and band of the previous bar.
+        """
+        previous_close, previous_band = self.previous_band
+        self.previous_band = (close, band)
+        if self.streamed_bars < min_length:
+            return False, False
+
+        enter = close > band and previous_close <= previous_band
+        if enter and self.current_bet == 0:
+            return True, False
+        self.trailing_stop = max(self.trailing_stop, stop_level)
+        exit = close < self.trailing_stop
+        if exit:
+            self.trailing_stop = 0
+        return enter, exit
+
+    def signals(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Entry and exit boolean columns over the whole frame, bar t being what
+        is_enter/is_exit would return on self.data[cutoff_begin : t + 1].
+        Strategies without state override it, the others keep the per bar loop.
+        """
+        return None
+
+    @classmethod
+    def panel_signals(
+        cls, panel: pl.DataFrame, pair_column: str, **params
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        signals() of every pair of a long panel at once, as columns aligned
+        with its rows, the pairs possibly interleaved, for batch_backtest.
+        None when they are computed pair by pair.
+        """
+        return None
+
+    def column(self, name: str) -> np.ndarray:
+        return self.data[name].to_numpy()
+
+    def trailing_stop_signals(
+        self, enter: np.ndarray, stop_level: str, min_length: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        signals() of strategies exiting when Close goes below the running max
+        of the stop_level column, see trailing_stop_scan
+        """
+        enough_history = self.has_history(min_length)
+        entries, exits, self.stop_levels = trailing_stop_scan(
+            enough_history & enter,
+            enough_history,
+            self.column(stop_level),
+            self.column("Close"),
+            self.cutoff_begin + 1,
+            self.cutoff_end,
         )
-        return results
+        return entries, exits
+
+    def has_history(self, min_length: int) -> np.ndarray:
+        """
+        Bars for which the slice seen by is_enter/is_exit has min_length rows
+        """
+        return np.arange(len(self.data)) - self.cutoff_begin + 1 >= min_length
+
+    def _run_bars(self, closes: list, bars, is_enter: Callable, is_exit: Callable):
+        """
+        is_enter/is_exit take the index of the last bar, the loop itself only
+        records the trades on plain python scalars
+        """
+        for last in bars:
+            if is_enter(last) and self.current_bet == 0:
+                self._entering_update(last, closes[last])
+            elif is_exit(last) and self.current_bet != 0:
+                self._exiting_update(last, closes[last])
 
-    def get_variation_to_date(self, current_df: DataFrame):
+        if self.cash == 0:
+            self._exiting_update(self.cutoff_end, closes[self.cutoff_end - 1])
+
+    def get_variation_to_date(self, close: float):
         if self.current_bet:
-            variation = (
-                current_df[-1, "Close"] - self.entry_prices[-1]
-            ) / self.entry_prices[-1]
+            variation = (close - self.entry_price) / self.entry_price
         else:
             variation = 0
         return variation
 
+    def get_buy_and_hold_return(self):
+        return (self.data[-1, "Close"] - self.data[0, "Close"]) / self.data[0, "Close"]
+
     def get_excess_return_vs_buy_and_hold(self, pnl):
-        buy_and_hold_perf = (
-            (self.data[-1, "Close"] - self.data[0, "Close"])
-            / self.data[0, "Close"]
-            * self.cash_history[0]
-        )
-        return (pnl - buy_and_hold_perf) / self.cash_history[0]
+        buy_and_hold_perf = self.get_buy_and_hold_return() * self.running_metrics.cash
+        return (pnl - buy_and_hold_perf) / self.running_metrics.cash
 
     def compute_kelly_criterion(
         self, win_rate: float, profit_pct_history: list
     ) -> float:
-        wins = list(filter(lambda x: x > 0, profit_pct_history))
-        losses = list(filter(lambda x: x < 0, profit_pct_history))
-
-        if wins:
-            G = sum(wins) / len(wins)
-        else:
-            G = 0
-
-        if losses:
-            V = abs(sum(losses) / len(losses))
-        else:
-            V = 0
-
-        if G == 0:
-            return 0
-        elif V == 0:
-            return 100
-        else:
-            return (win_rate / V) - ((1 - win_rate) / G)
+        return compute_kelly_criterion(win_rate, profit_pct_history)
 
-    def _entering_update(self, current_df):
-        self.entry_dates.append(current_df[-1, "Close Time"])
-        self.entry_prices.append(current_df[-1, "Close"])
+    def _entering_update(self, bar, price):
+        if self.record_trades:
+            self.entry_bars.append(bar)
+        self.entry_price = price
         self.current_bet, self.cash = self.cash, self.current_bet
 
-    def _exiting_update(self, current_df):
-        self.exit_dates.append(current_df[-1, "Close Time"])
-        self.exit_prices.append(current_df[-1, "Close"])
+    def _exiting_update(self, bar, price):
+        if self.record_trades:
+            self.exit_bars.append(bar)
 
-        variation_with_fees = self._get_variation() - 2 * self.fees / 100
+        variation = (price - self.entry_price) / self.entry_price
+        variation_with_fees = variation - 2 * self.fees / 100
 
-        self.profit_history.append(variation_with_fees * self.current_bet)
         self.current_bet, self.cash = 0, (1 + variation_with_fees) * self.current_bet
-
-        self.profit_pct_history.append(variation_with_fees)
-        self.cash_history.append(self.cash)
-
-    def _get_variation(self):
-        variation = (self.exit_prices[-1] - self.entry_prices[-1]) / self.entry_prices[
-            -1
-        ]
-        if variation > 0:
-            self.wins += 1
-        else:
-            self.losses += 1
-        return variation
+        self.running_metrics.add_trade(variation, variation_with_fees)
 
     @abstractmethod
     def is_enter(self, df: DataFrame):
@@ -21,6 +21,10 @@ class HeikinAshin(AbstractBacktest):
         )
         self.data = compute_heikin_ashin(data)
 
+    def signals(self):
+        ha_close, ha_open = self.column("ha_Close"), self.column("ha_Open")
+        return ha_close > ha_open, ha_close <= ha_open
+
     def is_enter(self, df: DataFrame):
         green = df[-1, "ha_Close"] > df[-1, "ha_Open"]
 
@@ -54,6 +58,15 @@ class HeikinAshinHMACross(AbstractBacktest):
         self.data = compute_hma(self.data, short_ma)
         self.data = compute_hma(self.data, long_ma)
 
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix="hma"))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix="hma"))  # type: ignore
+        ha_close, ha_open = self.column("ha_Close"), self.column("ha_Open")
+
+        enter = (ha_close > ha_open) & (ma_short > ma_long)
+        exit = (ha_close <= ha_open) & (ma_short < ma_long)
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         ma_crossed = (
             df[-1, get_ma_names(self.short_ma, prefix="hma")]  # type: ignore
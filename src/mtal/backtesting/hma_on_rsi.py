@@ -1,7 +1,9 @@
+import numpy as np
 from polars import DataFrame
 
 from src.mtal.analysis import compute_ema_on_rsi, compute_hma_on_rsi, compute_rsi
-from src.mtal.backtesting.common import AbstractBacktest
+from src.mtal.backtesting.common import AbstractBacktest, crossed_above
+from src.mtal.incremental import RSIState, moving_average_state
 from src.mtal.utils import get_ma_names
 
 
@@ -30,6 +32,32 @@ class HMA_RSI_CROSS(AbstractBacktest):
         else:
             self.data = compute_ema_on_rsi(self.data, short_ma)
             self.data = compute_ema_on_rsi(self.data, long_ma)
+        self.rsi_state = RSIState(14)
+        rsi_ma_type = "hma" if ma_type == "hma" else "ema"
+        self.short_state = moving_average_state(rsi_ma_type, short_ma)
+        self.long_state = moving_average_state(rsi_ma_type, long_ma)
+        self.previous_mas = (np.nan, np.nan)
+
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type, suffix="_on_RSI"))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type, suffix="_on_RSI"))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & crossed_above(ma_short, ma_long)
+        exit = enough_history & (ma_short < ma_long)
+        return enter, exit
+
+    def next_signals(self, bar):
+        rsi = self.rsi_state.update(bar["Close"])
+        ma_short = self.short_state.update(rsi)
+        ma_long = self.long_state.update(rsi)
+        previous_short, previous_long = self.previous_mas
+        self.previous_mas = (ma_short, ma_long)
+
+        if self.streamed_bars < 3:
+            return False, False
+        enter = ma_short > ma_long and previous_short <= previous_long
+        return enter, ma_short < ma_long
 
     def is_enter(self, df: DataFrame):
         """
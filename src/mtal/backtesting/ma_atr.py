@@ -1,14 +1,17 @@
+from typing import List
+
 import polars as pl
 from polars import DataFrame
 
 from src.mtal.analysis import (
-    compute_ehma,
+    MA_FUNCTIONS,
+    IndicatorSpec,
+    apply_indicators,
     compute_ema,
-    compute_hma,
     compute_keltner_low,
-    compute_vwma,
+    indicator_spec,
 )
-from src.mtal.backtesting.common import AbstractBacktest
+from src.mtal.backtesting.common import AbstractBacktest, crossed_above
 from src.mtal.utils import get_ma_names
 
 
@@ -28,22 +31,26 @@ class MAATR(AbstractBacktest):
             cutoff_end=cutoff_end,
             params=self.extract_named_params(locals()),
         )
-        if ma_type == "vwma":
-            self.data = compute_vwma(self.data, short_ma)
-            self.data = compute_vwma(self.data, long_ma)
-        elif ma_type == "hma":
-            self.data = compute_hma(self.data, short_ma)
-            self.data = compute_hma(self.data, long_ma)
-        elif ma_type == "ehma":
-            self.data = compute_ehma(self.data, short_ma)
-            self.data = compute_ehma(self.data, long_ma)
-        else:
-            self.data = compute_ema(self.data, short_ma)
-            self.data = compute_ema(self.data, long_ma)
-
-        self.data = compute_keltner_low(self.data)
+        self.data = apply_indicators(
+            self.data, self.indicators(short_ma, long_ma, ma_type)
+        )
         self.trailing_stop = 0
 
+    @classmethod
+    def indicators(cls, short_ma=5, long_ma=10, ma_type="ema") -> List[IndicatorSpec]:
+        compute_ma = MA_FUNCTIONS.get(ma_type, compute_ema)
+        return [
+            indicator_spec(compute_ma, span=short_ma),
+            indicator_spec(compute_ma, span=long_ma),
+            indicator_spec(compute_keltner_low),
+        ]
+
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+        enter = crossed_above(ma_short, ma_long)
+        return self.trailing_stop_signals(enter, "keltner_low", min_length=30)
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open if the previous ema is a cross
@@ -1,8 +1,24 @@
+import numpy as np
 import polars as pl
 from polars import DataFrame
 
-from src.mtal.analysis import compute_ehma, compute_ema, compute_hma, compute_vwma
-from src.mtal.backtesting.common import AbstractBacktest
+from src.mtal.analysis import (
+    MA_FUNCTIONS,
+    _moving_average_columns,
+    compute_ehma,
+    compute_ema,
+    compute_hma,
+    compute_mas,
+    compute_vwma,
+)
+from src.mtal.backtesting.common import (
+    AbstractBacktest,
+    crossed_above,
+    crossed_below,
+    shifted,
+)
+from src.mtal.compact import compact_columns
+from src.mtal.incremental import MOVING_AVERAGE_STATES, moving_average_state
 from src.mtal.utils import get_ma_names
 
 
@@ -34,6 +50,91 @@ class MACrossBacktester(AbstractBacktest):
         else:
             self.data = compute_ema(self.data, short_ma)
             self.data = compute_ema(self.data, long_ma)
+        self.previous_mas = None
+
+    def supports_streaming(self) -> bool:
+        return self.ma_type in MOVING_AVERAGE_STATES  # type: ignore
+
+    def next_signals(self, bar):
+        if self.previous_mas is None:
+            self.short_state = moving_average_state(self.ma_type, self.short_ma)  # type: ignore
+            self.long_state = moving_average_state(self.ma_type, self.long_ma)  # type: ignore
+            self.previous_mas = (np.nan, np.nan)
+
+        ma_short = self.short_state.update(bar["Close"])
+        ma_long = self.long_state.update(bar["Close"])
+        previous_short, previous_long = self.previous_mas
+        self.previous_mas = (ma_short, ma_long)
+
+        if self.streamed_bars < 3:
+            return False, False
+        enter = ma_short > ma_long and previous_short <= previous_long
+        exit = ma_short < ma_long and previous_short >= previous_long
+        return enter, exit
+
+    @classmethod
+    def precompute(cls, data: pl.DataFrame, ranges: dict):
+        names = ("short_ma", "long_ma")
+        spans = [span for name in names for span in ranges.get(name, [])]
+        for ma_type in ranges.get("ma_type", ["ema"]):
+            if ma_type in MA_FUNCTIONS:
+                compute_mas(data, spans, ma_type)
+
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & crossed_above(ma_short, ma_long)
+        exit = enough_history & crossed_below(ma_short, ma_long)
+        return enter, exit
+
+    @classmethod
+    def panel_signals(
+        cls,
+        panel: pl.DataFrame,
+        pair_column: str,
+        short_ma=5,
+        long_ma=10,
+        ma_type="ema",
+        cutoff_begin=None,
+        cutoff_end=None,
+    ):
+        """
+        The moving averages of every pair in one select, the polars expressions
+        of compute_<ma_type> evaluated over each pair. hma and ehma are not
+        expressions, their pairs are computed apart.
+        """
+        if ma_type not in ("ema", "vwma"):
+            return None
+        short_name = get_ma_names(short_ma, prefix=ma_type)
+        long_name = get_ma_names(long_ma, prefix=ma_type)
+        columns = {
+            **_moving_average_columns(ma_type, short_ma),
+            **_moving_average_columns(ma_type, long_ma),
+        }
+        mas = panel.select(
+            pair_column,
+            bar=pl.int_range(pl.len()).over(pair_column),
+            **{name: expr.over(pair_column) for name, expr in columns.items()},
+        )
+        # the previous bar of the same pair, whatever the order of the rows
+        previous = mas.select(
+            pl.col(name).shift().over(pair_column).alias(f"previous {i}")
+            for i, name in enumerate((short_name, long_name))
+        )
+        # same dtype as the columns of compute_<ma_type> in compact mode
+        ma_short, ma_long, previous_short, previous_long = (
+            column.to_numpy()
+            for column in compact_columns([mas[short_name], mas[long_name], *previous])
+        )
+        enough_history = mas["bar"].to_numpy() - (cutoff_begin or 0) + 1 >= 3
+
+        enter = (
+            enough_history & (ma_short > ma_long) & (previous_short <= previous_long)
+        )
+        exit = enough_history & (ma_short < ma_long) & (previous_short >= previous_long)
+        return enter, exit
 
     def is_enter(self, df: DataFrame):
         """
@@ -89,6 +190,14 @@ class MACrossLag(AbstractBacktest):
         self.ma_type = "hma"
         self.data = compute_hma(self.data, long_ma)
 
+    def signals(self):
+        ma = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+        ma_lagged = shifted(ma, self.gap)  # type: ignore
+
+        enter = self.has_history(self.gap + 3) & crossed_above(ma, ma_lagged)  # type: ignore
+        exit = self.has_history(self.gap + 1) & (ma < ma_lagged)  # type: ignore
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open if the previous ema is a cross
@@ -219,22 +328,37 @@ class MACrossAlphaBacktester(AbstractBacktest):
             self.data = compute_ema(self.data, short_ma)
             self.data = compute_ema(self.data, long_ma)
 
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & crossed_above(
+            ma_short, ma_long * (1 + self.alpha / 100)  # type: ignore
+        )
+        exit = enough_history & (ma_short < ma_long * (1 - self.alpha / 100))  # type: ignore
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open if the previous ema is a cross
         """
         if len(df) < 3:
             return False
-        just_crossed = (
-            df[-1, get_ma_names(self.short_ma, prefix=self.ma_type)]  # type: ignore
-            > df[-1, get_ma_names(self.long_ma, prefix=self.ma_type)]  # type: ignore
-            * (1 + self.alpha / 100)  # type: ignore
-        )
-        uncrossed_before = (
-            df[-2, get_ma_names(self.short_ma, prefix=self.ma_type)]  # type: ignore
-            <= df[-2, get_ma_names(self.long_ma, prefix=self.ma_type)]  # type: ignore
-            * (1 + self.alpha / 100)  # type: ignore
-        )
+        just_crossed = df[
+            -1, get_ma_names(self.short_ma, prefix=self.ma_type)
+        ] > df[  # type: ignore
+            -1, get_ma_names(self.long_ma, prefix=self.ma_type)
+        ] * (  # type: ignore
+            1 + self.alpha / 100
+        )  # type: ignore
+        uncrossed_before = df[
+            -2, get_ma_names(self.short_ma, prefix=self.ma_type)
+        ] <= df[  # type: ignore
+            -2, get_ma_names(self.long_ma, prefix=self.ma_type)
+        ] * (  # type: ignore
+            1 + self.alpha / 100
+        )  # type: ignore
 
         if just_crossed and uncrossed_before:
             return True
@@ -244,11 +368,13 @@ class MACrossAlphaBacktester(AbstractBacktest):
         if len(df) < 3:
             return False
 
-        just_crossed = (
-            df[-1, get_ma_names(self.short_ma, prefix=self.ma_type)]  # type: ignore
-            < df[-1, get_ma_names(self.long_ma, prefix=self.ma_type)]
-            * (1 - self.alpha / 100)  # type: ignore
-        )
+        just_crossed = df[
+            -1, get_ma_names(self.short_ma, prefix=self.ma_type)
+        ] < df[  # type: ignore
+            -1, get_ma_names(self.long_ma, prefix=self.ma_type)
+        ] * (
+            1 - self.alpha / 100
+        )  # type: ignore
 
         if just_crossed:
             return True
@@ -281,6 +407,16 @@ class MACrossPriceAboveBacktester(AbstractBacktest):
             self.data = compute_ema(self.data, short_ma)
             self.data = compute_ema(self.data, long_ma)
 
+    def signals(self):
+        close = self.column("Close")
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & crossed_above(ma_short, ma_long) & (close > ma_long)
+        exit = enough_history & (ma_short < ma_long)
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open there is a cross and the price is above the long ma
@@ -343,6 +479,15 @@ class PriceCrossMABacktester(AbstractBacktest):
         else:
             self.data = compute_ema(self.data, ma)
 
+    def signals(self):
+        close = self.column("Close")
+        ma = self.column(get_ma_names(self.ma, prefix=self.ma_type))  # type: ignore
+        enough_history = self.has_history(self.ma + 1)  # type: ignore
+
+        enter = enough_history & crossed_above(close, ma)
+        exit = enough_history & crossed_below(close, ma)
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open if the previous ema is a cross
@@ -411,6 +556,25 @@ class MACrossBacktesterOnTrend(AbstractBacktest):
             self.data = compute_ema(self.data, long_ma_up)
         self.data = compute_ema(self.data, ma_trend)
 
+    def signals(self):
+        close = self.column("Close")
+        uptrend = close > self.column(get_ma_names(self.ma_trend, prefix="ema"))  # type: ignore
+        short_up = self.column(get_ma_names(self.short_ma_up, prefix=self.ma_type))  # type: ignore
+        long_up = self.column(get_ma_names(self.long_ma_up, prefix=self.ma_type))  # type: ignore
+        short_down = self.column(get_ma_names(self.short_ma_down, prefix=self.ma_type))  # type: ignore
+        long_down = self.column(get_ma_names(self.long_ma_down, prefix=self.ma_type))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & np.where(
+            uptrend,
+            crossed_above(short_up, long_up),
+            crossed_above(short_down, long_down),
+        )
+        exit = enough_history & np.where(
+            uptrend, short_up < long_up, short_down < long_down
+        )
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         if len(df) < 3:
             return False
@@ -486,6 +650,17 @@ class MACrossBacktesterNoTradeTrendDown(AbstractBacktest):
             self.data = compute_ema(self.data, long_ma_up)
         self.data = compute_ema(self.data, ma_trend)
 
+    def signals(self):
+        close = self.column("Close")
+        uptrend = close > self.column(get_ma_names(self.ma_trend, prefix="ema"))  # type: ignore
+        ma_short = self.column(get_ma_names(self.short_ma_up, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma_up, prefix=self.ma_type))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & crossed_above(ma_short, ma_long) & uptrend
+        exit = enough_history & (ma_short < ma_long)
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         if len(df) < 3:
             return False
@@ -1,12 +1,19 @@
+import polars as pl
 from polars import DataFrame
 
 from src.mtal.analysis import (
     compute_anchored_obv,
+    compute_anchored_obvs,
     compute_hma,
     compute_hma_on_obv,
+    compute_mas,
     compute_obv,
 )
-from src.mtal.backtesting.common import AbstractBacktest
+from src.mtal.backtesting.common import (
+    AbstractBacktest,
+    crossed_above,
+    shifted,
+)
 from src.mtal.utils import get_ma_names
 
 
@@ -31,6 +38,15 @@ class TWO_MA_OBV_CROSS(AbstractBacktest):
         self.data = compute_hma_on_obv(self.data, short_ma)
         self.data = compute_hma_on_obv(self.data, long_ma)
 
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type, suffix="_on_OBV"))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type, suffix="_on_OBV"))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & crossed_above(ma_short, ma_long)
+        exit = enough_history & (ma_short < ma_long)
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open there is a cross and the price is above the long ma
@@ -87,6 +103,15 @@ class OBV_MA_CROSS(AbstractBacktest):
         self.ma_type = "hma"
         self.data = compute_hma_on_obv(self.data, long_ma)
 
+    def signals(self):
+        obv = self.column("OBV")
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type, suffix="_on_OBV"))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & crossed_above(obv, ma_long)
+        exit = enough_history & (obv < ma_long)
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open there is a cross and the price is above the long ma
@@ -143,6 +168,23 @@ class ANCHORED_OBV(AbstractBacktest):
 
         self.data = compute_anchored_obv(self.data, reset_period=reset_period)
 
+    @classmethod
+    def precompute(cls, data: pl.DataFrame, ranges: dict):
+        if "reset_period" in ranges:
+            compute_anchored_obvs(data, ranges["reset_period"])
+
+    def signals(self):
+        anchored_obv = self.column("Anchored_OBV")
+        enough_history = self.has_history(3)
+
+        enter = (
+            enough_history
+            & (anchored_obv > self.trigger_point_enter)  # type: ignore
+            & (shifted(anchored_obv) <= 0)
+        )
+        exit = enough_history & (anchored_obv < self.trigger_point_exit)  # type: ignore
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open there is a cross and the price is above the long ma
@@ -190,6 +232,26 @@ class ANCHORED_OBV_HMA_CROSS(AbstractBacktest):
         self.data = compute_hma(self.data, long_ma)
         self.data = compute_anchored_obv(self.data, reset_period=reset_period)
 
+    @classmethod
+    def precompute(cls, data: pl.DataFrame, ranges: dict):
+        names = ("short_ma", "long_ma")
+        spans = [span for name in names for span in ranges.get(name, [])]
+        compute_mas(data, spans, "hma")
+        ANCHORED_OBV.precompute(data, ranges)
+
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = (
+            enough_history
+            & (self.column("Anchored_OBV") > 0)
+            & crossed_above(ma_short, ma_long)
+        )
+        exit = enough_history & (ma_short < ma_long)
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open there is a cross and the price is above the long ma
@@ -1,8 +1,13 @@
 import polars as pl
 from polars import DataFrame
 
-from src.mtal.analysis import compute_hma, compute_renko
-from src.mtal.backtesting.common import AbstractBacktest
+from src.mtal.analysis import (
+    compute_hma,
+    compute_mas,
+    compute_renko,
+    compute_renko_bricks,
+)
+from src.mtal.backtesting.common import AbstractBacktest, crossed_above
 from src.mtal.utils import get_ma_names
 
 
@@ -25,6 +30,15 @@ class RenkoDirection(AbstractBacktest):
             data, span_atr=span_atr, brick_size_factor=brick_size_factor
         )
 
+    @classmethod
+    def precompute(cls, data: pl.DataFrame, ranges: dict):
+        for span_atr in ranges.get("span_atr", []):
+            compute_renko_bricks(data, span_atr, ranges.get("brick_size_factor", []))
+
+    def signals(self):
+        direction = self.column("Direction")
+        return direction == 1, direction == -1
+
     def is_enter(self, df: DataFrame):
         if df[-1, "Direction"] == 1:
             return True
@@ -60,6 +74,21 @@ class RenkoHMACross(AbstractBacktest):
             self.data, span_atr=span_atr, brick_size_factor=brick_size_factor
         )
 
+    @classmethod
+    def precompute(cls, data: pl.DataFrame, ranges: dict):
+        names = ("short_ma", "long_ma")
+        spans = [span for name in names for span in ranges.get(name, [])]
+        compute_mas(data, spans, "hma")
+        RenkoDirection.precompute(data, ranges)
+
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+
+        enter = (self.column("Direction") == 1) & crossed_above(ma_short, ma_long)
+        exit = ma_short < ma_long
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         renko_ok = df[-1, "Direction"] == 1
 
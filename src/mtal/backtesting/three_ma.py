@@ -1,8 +1,14 @@
 import polars as pl
 from polars import DataFrame
 
-from src.mtal.analysis import compute_ema, compute_hma, compute_vwma
-from src.mtal.backtesting.common import AbstractBacktest
+from src.mtal.analysis import (
+    MA_FUNCTIONS,
+    compute_ema,
+    compute_hma,
+    compute_mas,
+    compute_vwma,
+)
+from src.mtal.backtesting.common import AbstractBacktest, crossed_below
 from src.mtal.utils import get_ma_names
 
 
@@ -36,6 +42,24 @@ class ThreeMA(AbstractBacktest):
             self.data = compute_ema(self.data, mid_ma)
             self.data = compute_ema(self.data, long_ma)
 
+    @classmethod
+    def precompute(cls, data: pl.DataFrame, ranges: dict):
+        names = ("short_ma", "mid_ma", "long_ma")
+        spans = [span for name in names for span in ranges.get(name, [])]
+        for ma_type in ranges.get("ma_type", ["ema"]):
+            if ma_type in MA_FUNCTIONS:
+                compute_mas(data, spans, ma_type)
+
+    def signals(self):
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type))  # type: ignore
+        ma_mid = self.column(get_ma_names(self.mid_ma, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+        enough_history = self.has_history(3)
+
+        enter = enough_history & (ma_short > ma_mid) & (ma_mid > ma_long)
+        exit = enough_history & crossed_below(ma_short, ma_long)
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open if the previous ema is a cross
@@ -104,6 +128,19 @@ class ThreeMARetest(AbstractBacktest):
             self.data = compute_ema(self.data, mid_ma)
             self.data = compute_ema(self.data, long_ma)
 
+    def signals(self):
+        close = self.column("Close")
+        ma_short = self.column(get_ma_names(self.short_ma, prefix=self.ma_type))  # type: ignore
+        ma_mid = self.column(get_ma_names(self.mid_ma, prefix=self.ma_type))  # type: ignore
+        ma_long = self.column(get_ma_names(self.long_ma, prefix=self.ma_type))  # type: ignore
+
+        retest = (close - ma_long) / ma_long < self.distance_retest  # type: ignore
+        enter = self.has_history(self.long_ma + 6) & retest & (ma_mid > ma_long)  # type: ignore
+        exit = self.has_history(self.long_ma + 1) & (  # type: ignore
+            crossed_below(close, ma_short) | (ma_mid < ma_long)
+        )
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         """
         We enter at the current open if the previous ema is a cross
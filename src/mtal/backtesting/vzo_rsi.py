@@ -23,6 +23,15 @@ class VZO_RSI(AbstractBacktest):
         self.data = compute_rsi(self.data, window=span)
         self.data = compute_vzo(self.data, window=span)
 
+    def signals(self):
+        vzo, rsi = self.column("VZO"), self.column("RSI")
+        enter = (
+            self.has_history(3)
+            & (vzo > 0 + self.grey_zone_vzo * 2)  # type: ignore
+            & (rsi > 50 + self.grey_zone_rsi)  # type: ignore
+        )
+        return enter, ~enter
+
     def is_enter(self, df: DataFrame):
         if len(df) < 3:
             return False
@@ -56,6 +65,22 @@ class VZO_RSI_let_grey(AbstractBacktest):
         self.data = compute_rsi(self.data, window=span)
         self.data = compute_vzo(self.data, window=span)
 
+    def signals(self):
+        vzo, rsi = self.column("VZO"), self.column("RSI")
+        enough_history = self.has_history(3)
+
+        enter = (
+            enough_history
+            & (vzo > 0 + self.grey_zone_vzo)  # type: ignore
+            & (rsi > 50 + self.grey_zone_rsi)  # type: ignore
+        )
+        exit = (
+            enough_history
+            & (vzo < 0 - self.grey_zone_vzo)  # type: ignore
+            & (rsi < 50 - self.grey_zone_rsi)  # type: ignore
+        )
+        return enter, exit
+
     def is_enter(self, df: DataFrame):
         if len(df) < 3:
             return False
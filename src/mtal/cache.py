@@ -0,0 +1,158 @@
+import hashlib
+import inspect
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Hashable, List, Optional
+
+import polars as pl
+
+from src.mtal.compact import compact_columns, compact_enabled
+
+
+class IndicatorCache:
+    """
+    Indicator columns keyed by (fingerprint of the columns read, indicator
+    name, params). Least recently used entries are evicted once the columns
+    held exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024**2) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[List[pl.Series]]:
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key: Hashable, columns: List[pl.Series]):
+        size = sum(column.estimated_size() for column in columns)
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (columns, size)
+        self.size += size
+        self.resize(self.max_bytes)
+
+    def resize(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        while self.size > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+indicator_cache = IndicatorCache()
+
+
+# fingerprints of the columns hashed last, keyed by their buffers
+_fingerprints: OrderedDict = OrderedDict()
+FINGERPRINT_MEMO_SIZE = 64
+
+
+def fingerprint(df: pl.DataFrame, columns) -> bytes:
+    """
+    Content hash of the given columns, equal for clones or reloads of the same
+    data. Memoized on the buffers of the columns, which clones and the frames
+    derived with with_columns share, so the columns of a frame are hashed once.
+    """
+    series = [df[name] for name in columns]
+    key = _buffers_key(series)
+    if key in _fingerprints:
+        _fingerprints.move_to_end(key)
+        return _fingerprints[key][0]
+
+    digest = hashlib.blake2b(digest_size=16)
+    for column in series:
+        digest.update(f"{column.name}|{column.dtype}|{column.null_count()}|".encode())
+        digest.update(column.hash(seed=0).to_numpy().tobytes())
+    if key is not None:
+        # holding the series keeps their buffers from being freed and reused,
+        # and polars copies them on write while they are shared
+        _fingerprints[key] = (digest.digest(), series)
+        if len(_fingerprints) > FINGERPRINT_MEMO_SIZE:
+            _fingerprints.popitem(last=False)
+    return digest.digest()
+
+
+def _buffers_key(series: List[pl.Series]) -> Optional[Hashable]:
+    """
+    Address, offset and length of the values of each series, None for the
+    ones without a single buffer (strings, several chunks)
+    """
+    try:
+        return tuple(
+            (column.name, column.dtype, column.null_count(), *column._get_buffer_info())
+            for column in series
+        )
+    except (TypeError, pl.ComputeError):
+        return None
+
+
+def cached_indicator(*inputs: str) -> Callable:
+    """
+    Serves a compute_* function from indicator_cache, inputs being the columns
+    it reads. The function adds the same columns to any frame with the same
+    inputs and params, so the cached ones are appended to df without
+    recomputing. Existing columns of df are only replaced when the indicator
+    rewrites them (like data_hull), not for dtype changes of pandas round trips.
+    In compact_mode the columns are kept as compact_columns, under their own
+    keys.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        signature = inspect.signature(function)
+
+        def cache_key(df: pl.DataFrame, *args, **kwargs) -> Optional[Hashable]:
+            if len(df) == 0 or not set(inputs) <= set(df.columns):
+                return None
+            params = signature.bind(df, *args, **kwargs)
+            params.apply_defaults()
+            return (
+                fingerprint(df, inputs),
+                function.__name__,
+                tuple(params.arguments.items())[1:],
+                compact_enabled(),
+            )
+
+        @wraps(function)
+        def cached_function(df: pl.DataFrame, *args, **kwargs):
+            key = cache_key(df, *args, **kwargs)
+            if key is None:
+                return function(df, *args, **kwargs)
+
+            columns = indicator_cache.get(key)
+            if columns is None:
+                result = function(df, *args, **kwargs)
+                if len(result) != len(df):
+                    return result
+                columns = compact_columns(
+                    result[name]
+                    for name in result.columns
+                    if name not in df.columns
+                    or (
+                        result[name].dtype == df[name].dtype
+                        and not result[name].equals(df[name])
+                    )
+                )
+                indicator_cache.put(key, columns)
+            return df.with_columns(columns)
+
+        # lets batch computations store the columns of each call they cover
+        cached_function.cache_key = cache_key  # type: ignore
+        return cached_function
+
+    return decorator
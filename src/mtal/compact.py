@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List
+
+import polars as pl
+
+# columns the indicators only compute on the way to their outputs
+INTERMEDIATE_COLUMNS = (
+    "data_hull",
+    "Change",
+    "Gain",
+    "Loss",
+    "Avg Gain",
+    "Avg Loss",
+    "RS",
+)
+
+_compact = False
+
+
+@contextmanager
+def compact_mode(enabled: bool = True) -> Iterator[None]:
+    """
+    with compact_mode(): the indicators computed inside the block are
+    float32 and without their INTERMEDIATE_COLUMNS, in the returned frames
+    as in the indicator cache, and the klines loaded are compact_frame.
+    For universe-wide screens where many frames stay alive.
+    """
+    global _compact
+    previous, _compact = _compact, enabled
+    try:
+        yield
+    finally:
+        _compact = previous
+
+
+def compact_enabled() -> bool:
+    return _compact
+
+
+def compact_columns(columns: Iterable[pl.Series]) -> List[pl.Series]:
+    """
+    The indicator columns to keep in compact mode: float32, the
+    intermediates dropped. Unchanged otherwise.
+    """
+    if not _compact:
+        return list(columns)
+    return [
+        column.cast(pl.Float32) if column.dtype == pl.Float64 else column
+        for column in columns
+        if column.name not in INTERMEDIATE_COLUMNS
+    ]
+
+
+def compact_frame(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    df with float32 prices, volumes and indicators, dates and datetimes as
+    int64 epoch milliseconds and without the intermediate columns
+    """
+    return df.drop(
+        name for name in INTERMEDIATE_COLUMNS if name in df.columns
+    ).with_columns(
+        pl.col(pl.Float64).cast(pl.Float32),
+        pl.col(pl.Date, pl.Datetime).dt.epoch("ms"),
+    )
@@ -4,6 +4,8 @@ from datetime import datetime
 import polars as pl
 from binance.spot import Spot
 
+from src.mtal.compact import compact_enabled, compact_frame
+
 client = Spot()
 AUTHORIZED_PAIRS = {"USDT", "BTC"}
 
@@ -97,7 +99,19 @@ def get_pair_df(
         df["Close"].cast(pl.Float64),
         df["Volume"].cast(pl.Float64),
     )
-    return df
+    return compact_frame(df) if compact_enabled() else df
+
+
+def get_pairs_panel(pairs, pair_column="Pair", **kwargs):
+    """
+    Long frame of the klines of every pair, as expected by batch_backtest
+    """
+    frames = []
+    for pair in pairs:
+        df = get_pair_df(pair=pair, **kwargs)
+        if len(df):
+            frames.append(df.with_columns(pl.lit(pair).alias(pair_column)))
+    return pl.concat(frames)
 
 
 def map_market(value):
@@ -125,4 +139,4 @@ def get_stock_data(ticker, period="w"):
     if not len(df):
         return pl.DataFrame()
     df = df.with_columns(df["Date"].alias("Close Time"))
-    return df
+    return compact_frame(df) if compact_enabled() else df
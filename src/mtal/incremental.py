@@ -0,0 +1,300 @@
+import math
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.mtal.analysis import WMA_BLOCK
+
+
+class IndicatorState:
+    """
+    An indicator updated one bar at a time in O(1), with the same arithmetic
+    as its batch compute_* function so that the values are exactly the
+    batch ones, but for the BBState deviation which only matches to rounding.
+    to_dict gives the state as plain numbers, lists and dicts
+    (JSON serializable) and indicator_state_from_dict resumes it, without
+    replaying the history.
+    """
+
+    def to_dict(self) -> dict:
+        state = {name: _to_builtin(value) for name, value in vars(self).items()}
+        return {"state": type(self).__name__, **state}
+
+
+def _to_builtin(value):
+    if isinstance(value, IndicatorState):
+        return value.to_dict()
+    elif isinstance(value, deque):
+        return {"deque": [_to_builtin(item) for item in value], "maxlen": value.maxlen}
+    elif isinstance(value, (tuple, list)):
+        return [_to_builtin(item) for item in value]
+    elif isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _from_builtin(value):
+    if isinstance(value, dict) and "state" in value:
+        return indicator_state_from_dict(value)
+    elif isinstance(value, dict) and "deque" in value:
+        items = [_from_builtin(item) for item in value["deque"]]
+        return deque(items, maxlen=value["maxlen"])
+    elif isinstance(value, list):
+        return tuple(_from_builtin(item) for item in value)
+    return value
+
+
+def indicator_state_from_dict(state: dict) -> IndicatorState:
+    indicator_state = STATES[state["state"]].__new__(STATES[state["state"]])
+    for name, value in state.items():
+        if name != "state":
+            setattr(indicator_state, name, _from_builtin(value))
+    return indicator_state
+
+
+class EMAState(IndicatorState):
+    """
+    df["Close"].ewm(span=span, adjust=False).mean() one value at a time,
+    or with the smoothing factor alpha, with the same arithmetic as pandas
+    """
+
+    def __init__(self, span: Optional[int] = None, alpha: Optional[float] = None):
+        self.span = span
+        if alpha is None:
+            alpha = 1.0 / (1.0 + (span - 1) / 2.0)  # type: ignore
+        self.alpha = alpha
+        self.value = np.nan
+
+    def update(self, value: float) -> float:
+        if np.isnan(self.value):
+            self.value = value
+        else:
+            old_weight = 1.0 - self.alpha
+            self.value = (old_weight * self.value + self.alpha * value) / (
+                old_weight + self.alpha
+            )
+        return self.value
+
+
+class WMAState(IndicatorState):
+    """
+    weighted_moving_average over the last span values, with the same block
+    prefix sums, NaN until span values are seen and over windows with a NaN
+    """
+
+    def __init__(self, span: int) -> None:
+        self.span = span
+        self.block = WMA_BLOCK * -(-span // WMA_BLOCK)
+        self.index = -1
+        self.sums = 0.0
+        self.weighted_sums = 0.0
+        # prefix sums at the end of the previous block and of the last span + 1 bars
+        self.previous_block = (0.0, 0.0)
+        self.prefix_sums: deque = deque(maxlen=span + 1)
+        # index of the last NaN value, the windows up to span - 1 bars later are NaN
+        self.last_missing = -span
+
+    def update(self, value: float) -> float:
+        self.index += 1
+        position = self.index % self.block
+        if position == 0:
+            self.previous_block = (self.sums, self.weighted_sums)
+            self.sums = self.weighted_sums = 0.0
+        if np.isnan(value):
+            self.last_missing = self.index
+            value = 0.0
+        self.sums += value
+        self.weighted_sums += position * value
+        self.prefix_sums.append((self.sums, self.weighted_sums))
+        if self.index < self.span - 1 or self.index - self.last_missing < self.span:
+            return np.nan
+
+        start = self.index - self.span + 1
+        base = self.index - position
+        if start % self.block == 0:
+            start_sums, start_weighted_sums = 0.0, 0.0
+        else:
+            start_sums, start_weighted_sums = self.prefix_sums[0]
+        if start >= base:
+            sums = self.sums - start_sums
+            weighted_sums = self.weighted_sums - start_weighted_sums
+        else:
+            tail_sums = self.previous_block[0] - start_sums
+            sums = self.sums + tail_sums
+            weighted_sums = self.weighted_sums + (
+                self.previous_block[1] - start_weighted_sums - self.block * tail_sums
+            )
+        weighted = weighted_sums - (start - 1 - base) * sums
+        return weighted * (2 / (self.span * (self.span + 1)))
+
+
+class HMAState(IndicatorState):
+    """
+    compute_hma one Close at a time: WMA of sqrt(span) bars over
+    2 * WMA(span // 2) - WMA(span), 0 while undefined
+    """
+
+    def __init__(self, span: int) -> None:
+        self.span = span
+        self.half = self._half_state(span)
+        self.full = WMAState(span)
+        self.hull = WMAState(int(np.sqrt(span)))
+        self.value = 0.0
+
+    def _half_state(self, span: int):
+        return WMAState(span // 2)
+
+    def update(self, value: float) -> float:
+        data_hull = 2 * self.half.update(value) - self.full.update(value)
+        hma = self.hull.update(data_hull)
+        self.value = hma if not np.isnan(hma) else 0.0
+        return self.value
+
+
+class EHMAState(HMAState):
+    """
+    compute_ehma one Close at a time, the hull of EMAs instead of WMAs
+    """
+
+    def __init__(self, span: int) -> None:
+        super().__init__(span)
+        self.full = EMAState(span)
+
+    def _half_state(self, span: int):
+        return EMAState(span // 2)
+
+
+class RSIState(IndicatorState):
+    """
+    The RSI of compute_rsi one Close at a time, Wilder smoothing of the
+    gains and losses, NaN on the first bar
+    """
+
+    def __init__(self, window: int = 14) -> None:
+        self.window = window
+        self.previous_close = np.nan
+        self.average_gain = EMAState(alpha=1 / window)
+        self.average_loss = EMAState(alpha=1 / window)
+        self.value = np.nan
+
+    def update(self, close: float) -> float:
+        change = close - self.previous_close
+        self.previous_close = close
+        if np.isnan(change):
+            return self.value
+
+        gain = self.average_gain.update(0.0 if change < 0 else change)
+        loss = self.average_loss.update(-(0.0 if change > 0 else change))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rs = np.float64(gain) / loss
+        self.value = float(100 - (100 / (1 + rs)))
+        return self.value
+
+
+class ATRState(IndicatorState):
+    """
+    compute_atr one bar at a time: 0 for the first span - 1 bars, the mean
+    true range of the first span bars, then Wilder smoothing
+    """
+
+    def __init__(self, span: int = 14) -> None:
+        self.span = span
+        self.index = -1
+        self.previous_close = np.nan
+        self.true_range_sum = 0.0
+        self.average = EMAState(alpha=1.0 / (1.0 + (span - 1)))
+        self.value = 0.0
+
+    def update(self, high: float, low: float, close: float) -> float:
+        true_range = high - low
+        if not np.isnan(self.previous_close):
+            true_range = max(
+                true_range,
+                abs(high - self.previous_close),
+                abs(low - self.previous_close),
+            )
+        self.previous_close = close
+        self.index += 1
+
+        if self.index < self.span:
+            self.true_range_sum += true_range
+        if self.index == self.span - 1:
+            self.value = self.average.update(self.true_range_sum * (1 / self.span))
+        elif self.index >= self.span:
+            self.value = self.average.update(true_range)
+        return self.value
+
+
+class BBState(IndicatorState):
+    """
+    compute_BB one Close at a time, returning (BB_hband, BB_mid, BB_lband),
+    NaN until window values are seen. The mean is a running sum like polars
+    rolling_mean, the variance a running sum of the squared deviations from
+    it, updated as values enter and leave the window.
+    """
+
+    def __init__(self, window: int = 20, window_dev=2) -> None:
+        self.window = window
+        self.window_dev = window_dev
+        self.values: deque = deque(maxlen=window)
+        self.sum = 0.0
+        self.squares = 0.0
+        self.value = (np.nan, np.nan, np.nan)
+
+    def update(self, close: float) -> Tuple[float, float, float]:
+        mean = self.sum / len(self.values) if self.values else 0.0
+        leaving = self.values.popleft() if len(self.values) == self.window else None
+        self.values.append(close)
+        if leaving is not None and not math.isfinite(leaving):
+            # the sums were NaN since it entered, recomputed once it leaves
+            self.sum = 0.0
+            for value in self.values:
+                self.sum += value
+            mean = self.sum / len(self.values)
+            self.squares = 0.0
+            for value in self.values:
+                self.squares += (value - mean) * (value - mean)
+        elif leaving is not None:
+            self.sum -= leaving
+            self.sum += close
+            delta = close - leaving
+            self.squares += delta * (close - self.sum / self.window + leaving - mean)
+        else:
+            self.sum += close
+            self.squares += (close - mean) * (close - self.sum / len(self.values))
+        if len(self.values) < self.window:
+            return self.value
+
+        mavg = self.sum / self.window
+        mstd = math.sqrt(max(self.squares, 0.0) / self.window)
+        self.value = (
+            mavg + self.window_dev * mstd,
+            mavg,
+            mavg - self.window_dev * mstd,
+        )
+        return self.value
+
+
+STATES = {
+    state.__name__: state
+    for state in (
+        EMAState,
+        WMAState,
+        HMAState,
+        EHMAState,
+        RSIState,
+        ATRState,
+        BBState,
+    )
+}
+
+
+# the moving averages with an incremental state, by ma_type
+MOVING_AVERAGE_STATES = {"hma": HMAState, "ehma": EHMAState, "ema": EMAState}
+
+
+def moving_average_state(ma_type: str, span: int):
+    if ma_type not in MOVING_AVERAGE_STATES:
+        raise ValueError(f"No incremental state for {ma_type} moving averages")
+    return MOVING_AVERAGE_STATES[ma_type](span)
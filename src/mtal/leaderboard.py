@@ -0,0 +1,71 @@
+import heapq
+import math
+from typing import List, Tuple
+
+import polars as pl
+
+from src.mtal.backtesting.common import BacktestMetrics
+
+
+class Leaderboard:
+    """
+    Streaming selection over the runs of a train_strategy sweep. The
+    BacktestMetrics of the top_k combinations by excess return over buy and
+    hold are kept in a heap, and every run only as a row of scalar metrics in
+    a polars DataFrame, so the memory does not grow with the number of
+    objects of the grid. Ties keep the first combination run.
+    """
+
+    def __init__(self, top_k: int = 1) -> None:
+        if top_k < 1:
+            raise ValueError(f"top_k must be at least 1, not {top_k}")
+        self.top_k = top_k
+        # min heap of (score, -order, params, metrics), the worst kept on top
+        self._heap: List[Tuple[float, int, dict, BacktestMetrics]] = []
+        self._frames: List[pl.DataFrame] = []
+        self._runs = 0
+
+    def __len__(self):
+        return self._runs
+
+    def add(self, param_combinations: List[dict], metrics: List[BacktestMetrics]):
+        """
+        Records the metrics of a chunk of combinations, in the order of the run
+        """
+        if not param_combinations:
+            return
+        for params, params_metrics in zip(param_combinations, metrics):
+            score = params_metrics.excess_return_vs_buy_and_hold
+            entry = (-math.inf if math.isnan(score) else score, -self._runs)
+            if len(self._heap) < self.top_k:
+                heapq.heappush(self._heap, (*entry, params, params_metrics))
+            elif entry > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, (*entry, params, params_metrics))
+            self._runs += 1
+
+        self._frames.append(
+            pl.DataFrame(
+                [
+                    {**params, **params_metrics.metrics()}
+                    for params, params_metrics in zip(param_combinations, metrics)
+                ],
+                infer_schema_length=None,
+            )
+        )
+
+    @property
+    def best(self) -> List[Tuple[dict, BacktestMetrics]]:
+        """
+        The params and metrics of the top_k combinations, the best first
+        """
+        return [(params, metrics) for *_, params, metrics in sorted(self._heap)[::-1]]
+
+    @property
+    def frame(self) -> pl.DataFrame:
+        """
+        The params and scalar metrics of every run, in the order of the runs
+        """
+        if not self._frames:
+            return pl.DataFrame()
+        self._frames = [pl.concat(self._frames, how="vertical_relaxed")]
+        return self._frames[0]
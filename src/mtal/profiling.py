@@ -0,0 +1,105 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+import polars as pl
+
+
+@dataclass
+class BacktestStats:
+    """
+    Wall time in seconds per phase and counters, summed over every backtester
+    built and run inside collect_stats
+    """
+
+    indicator_time: float = 0.0
+    signal_time: float = 0.0
+    bookkeeping_time: float = 0.0
+    runs: int = 0
+    bars: int = 0
+    indicator_calls: int = 0
+    slices: int = 0
+    conversions: int = 0
+    indicator_depth: int = field(default=0, repr=False)
+
+    @property
+    def run_time(self) -> float:
+        return self.signal_time + self.bookkeeping_time
+
+    @property
+    def bars_per_second(self) -> float:
+        return self.bars / self.run_time if self.run_time else 0.0
+
+    def timed(self, phase: str, function: Callable) -> Callable:
+        @wraps(function)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                setattr(self, phase, getattr(self, phase) + time.perf_counter() - start)
+
+        return timed_function
+
+
+_active_stats: Optional[BacktestStats] = None
+
+
+@contextmanager
+def collect_stats() -> Iterator[BacktestStats]:
+    """
+    with collect_stats() as stats: instruments the indicator precompute and
+    the runs of the backtesters built inside the block. Free when not used.
+    """
+    global _active_stats
+    previous, _active_stats = _active_stats, BacktestStats()
+    try:
+        yield _active_stats
+    finally:
+        _active_stats = previous
+
+
+def current_stats() -> Optional[BacktestStats]:
+    return _active_stats
+
+
+def count(counter: str, number=1):
+    if _active_stats is not None:
+        setattr(_active_stats, counter, getattr(_active_stats, counter) + number)
+
+
+def indicator(function: Callable) -> Callable:
+    """
+    Times a compute_* function as indicator precompute, nested calls being
+    counted but only timed once
+    """
+
+    @wraps(function)
+    def timed_indicator(*args, **kwargs):
+        stats = _active_stats
+        if stats is None:
+            return function(*args, **kwargs)
+
+        stats.indicator_calls += 1
+        if stats.indicator_depth:
+            return function(*args, **kwargs)
+        stats.indicator_depth += 1
+        try:
+            return stats.timed("indicator_time", function)(*args, **kwargs)
+        finally:
+            stats.indicator_depth -= 1
+
+    return timed_indicator
+
+
+def to_pandas(df: pl.DataFrame) -> pd.DataFrame:
+    count("conversions")
+    return df.to_pandas()
+
+
+def from_pandas(df: pd.DataFrame) -> pl.DataFrame:
+    count("conversions")
+    return pl.from_pandas(df)
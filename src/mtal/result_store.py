@@ -0,0 +1,101 @@
+import json
+import sqlite3
+from typing import List, Optional, Type
+
+import polars as pl
+
+from src.mtal.backtesting.common import AbstractBacktest, BacktestMetrics
+from src.mtal.cache import fingerprint
+
+
+class ResultStore:
+    """
+    Metrics of the train_strategy runs in a SQLite file, keyed by backtester
+    class, params, dataset fingerprint and cutoff. Sweeps read the runs
+    already stored and write the others chunk by chunk, so an interrupted
+    sweep resumes where it stopped and a wider one only runs the new
+    combinations. Closes its connection on exit as a context manager.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "backtester TEXT, params TEXT, dataset TEXT, cutoff INTEGER, "
+                "metrics TEXT, PRIMARY KEY (backtester, params, dataset, cutoff))"
+            )
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get_many(
+        self,
+        backtester_class: Type[AbstractBacktest],
+        dataset: str,
+        cutoff: int,
+        param_combinations: List[dict],
+    ) -> List[Optional[BacktestMetrics]]:
+        """
+        The stored metrics of each combination, None for the ones not run yet
+        """
+        rows = self.connection.execute(
+            "SELECT params, metrics FROM results "
+            "WHERE backtester = ? AND dataset = ? AND cutoff = ?",
+            (_class_key(backtester_class), dataset, cutoff),
+        )
+        stored = dict(rows.fetchall())
+        states = [stored.get(_params_key(params)) for params in param_combinations]
+        return [
+            BacktestMetrics.from_dict(json.loads(state)) if state else None
+            for state in states
+        ]
+
+    def put_many(
+        self,
+        backtester_class: Type[AbstractBacktest],
+        dataset: str,
+        cutoff: int,
+        param_combinations: List[dict],
+        metrics: List[BacktestMetrics],
+    ):
+        """
+        Stores the metrics of the combinations in one transaction
+        """
+        backtester = _class_key(backtester_class)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        backtester,
+                        _params_key(params),
+                        dataset,
+                        cutoff,
+                        json.dumps(params_metrics.to_dict()),
+                    )
+                    for params, params_metrics in zip(param_combinations, metrics)
+                ],
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def dataset_fingerprint(data: pl.DataFrame) -> str:
+    return fingerprint(data, data.columns).hex()
+
+
+def _class_key(backtester_class: Type[AbstractBacktest]) -> str:
+    return f"{backtester_class.__module__}.{backtester_class.__qualname__}"
+
+
+def _params_key(params: dict) -> str:
+    return json.dumps(params, sort_keys=True, default=repr)
@@ -0,0 +1,158 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# share of the results the parzen search models as the good ones
+PARZEN_GOOD_QUANTILE = 0.25
+# candidates drawn from the good density per combination proposed
+PARZEN_CANDIDATES = 64
+
+
+@dataclass(frozen=True)
+class Interval:
+    """
+    Continuous domain of a param in the ranges of a random or bayes search,
+    values drawn in [low, high]
+    """
+
+    low: float
+    high: float
+
+    def draw(self, rng: np.random.Generator, size=None):
+        return rng.uniform(self.low, self.high, size)
+
+
+def _domains(ranges: dict) -> Dict[str, Any]:
+    return {
+        key: domain if isinstance(domain, Interval) else list(domain)
+        for key, domain in ranges.items()
+    }
+
+
+def _draw(domain, rng: np.random.Generator, size: int) -> np.ndarray:
+    """
+    Values of an Interval, positions in the values of a discrete domain
+    """
+    if isinstance(domain, Interval):
+        return domain.draw(rng, size)
+    return rng.integers(len(domain), size=size)
+
+
+def _value(domain, draw):
+    return float(draw) if isinstance(domain, Interval) else domain[draw]
+
+
+def grid_size(ranges: dict) -> Optional[int]:
+    """
+    Number of combinations of ranges, None when a domain is an Interval
+    """
+    if any(isinstance(domain, Interval) for domain in ranges.values()):
+        return None
+    return math.prod(len(list(domain)) for domain in ranges.values())
+
+
+def random_combinations(ranges: dict, number: int, rng: np.random.Generator):
+    """
+    number combinations drawn uniformly from ranges. Without Interval they
+    are distinct and in the grid order, the whole grid when it is smaller.
+    """
+    domains = _domains(ranges)
+    size = grid_size(ranges)
+    if size is None:
+        draws = {key: _draw(domain, rng, number) for key, domain in domains.items()}
+        return [
+            {key: _value(domain, draws[key][i]) for key, domain in domains.items()}
+            for i in range(number)
+        ]
+
+    sizes = [len(domain) for domain in domains.values()]
+    indices = np.sort(rng.choice(size, size=min(number, size), replace=False))
+    return [
+        {key: domain[i] for (key, domain), i in zip(domains.items(), position)}
+        for position in zip(*np.unravel_index(indices, sizes))
+    ]
+
+
+def parzen_proposals(
+    ranges: dict,
+    combinations: List[dict],
+    scores: Sequence[float],
+    number: int,
+    rng: np.random.Generator,
+) -> List[dict]:
+    """
+    Tree-structured Parzen estimator: number new combinations among
+    candidates drawn from the density of the best PARZEN_GOOD_QUANTILE of the
+    scores, those where it is the highest relative to the density of the
+    others. Each param is modeled apart, discrete values by smoothed counts
+    and Intervals by gaussian kernels.
+    """
+    domains = _domains(ranges)
+    ranking = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind="stable")
+    good = np.zeros(len(combinations), dtype=bool)
+    good[ranking[: max(1, int(PARZEN_GOOD_QUANTILE * len(combinations)))]] = True
+
+    candidates = number * PARZEN_CANDIDATES
+    drawn: Dict[str, np.ndarray] = {}
+    log_ratio = np.zeros(candidates)
+    for key, domain in domains.items():
+        values = [combination[key] for combination in combinations]
+        if isinstance(domain, Interval):
+            points = np.array(values, dtype=float)
+            centers = points[good][rng.integers(good.sum(), size=candidates)]
+            bandwidth = _bandwidth(domain, good.sum())
+            draws = rng.normal(centers, bandwidth).clip(domain.low, domain.high)
+            # the uniform prior as one more kernel
+            prior = rng.random(candidates) < 1 / (good.sum() + 1)
+            drawn[key] = np.where(prior, _draw(domain, rng, candidates), draws)
+            log_ratio += _log_kernel_density(drawn[key], points[good], domain)
+            log_ratio -= _log_kernel_density(drawn[key], points[~good], domain)
+        else:
+            index = {value: i for i, value in enumerate(domain)}
+            positions = np.array([index[value] for value in values])
+            good_density = _smoothed_frequencies(positions[good], len(index))
+            bad_density = _smoothed_frequencies(positions[~good], len(index))
+            drawn[key] = rng.choice(len(index), size=candidates, p=good_density)
+            log_ratio += np.log(good_density[drawn[key]])
+            log_ratio -= np.log(bad_density[drawn[key]])
+
+    seen = {tuple(combination.values()) for combination in combinations}
+    proposals = []
+    for i in np.argsort(-log_ratio, kind="stable"):
+        combination = {
+            key: _value(domain, drawn[key][i]) for key, domain in domains.items()
+        }
+        if tuple(combination.values()) not in seen:
+            seen.add(tuple(combination.values()))
+            proposals.append(combination)
+        if len(proposals) == number:
+            break
+
+    size = grid_size(ranges)
+    if not proposals and size is not None:
+        # every candidate already run, the grid is about exhausted
+        proposals = [
+            combination
+            for combination in random_combinations(ranges, size, rng)
+            if tuple(combination.values()) not in seen
+        ][:number]
+    return proposals
+
+
+def _smoothed_frequencies(positions: np.ndarray, size: int) -> np.ndarray:
+    return (np.bincount(positions, minlength=size) + 1) / (len(positions) + size)
+
+
+def _bandwidth(domain: Interval, points: int) -> float:
+    return (domain.high - domain.low) * (points + 1) ** -0.2
+
+
+def _log_kernel_density(
+    values: np.ndarray, points: np.ndarray, domain: Interval
+) -> np.ndarray:
+    bandwidth = _bandwidth(domain, len(points))
+    kernels = np.exp(-0.5 * ((values[:, None] - points[None, :]) / bandwidth) ** 2)
+    density = kernels.sum(axis=1) / (bandwidth * math.sqrt(2 * math.pi))
+    return np.log((1 / (domain.high - domain.low) + density) / (len(points) + 1))
@@ -1,9 +1,37 @@
-from itertools import product
-from typing import Tuple, Type
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice, product
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Type, Union
 
+import numpy as np
 import polars as pl
 
-from src.mtal.backtesting.common import AbstractBacktest, BacktestResults
+from src.mtal.backtesting.common import (
+    AbstractBacktest,
+    BacktestMetrics,
+    BacktestResults,
+)
+from src.mtal.leaderboard import Leaderboard
+from src.mtal.result_store import ResultStore, dataset_fingerprint
+from src.mtal.search import Interval, parzen_proposals, random_combinations
+
+# shortest training prefix of the first rung of successive halving
+HALVING_MIN_BARS = 50
+# share of the budget of the bayes search drawn at random before modeling
+BAYES_STARTUP = 0.2
+# combinations proposed per round of the bayes search, whatever n_jobs
+BAYES_BATCH = 8
+SEARCHES = ("grid", "halving", "random", "bayes")
+# combinations run between two writes to the result store in a serial sweep
+CHECKPOINT_SIZE = 256
+# combinations of the grid built and run at once, bounding the memory of a sweep
+SWEEP_CHUNK = 8192
+
+# data of the sweep in a worker process, memory mapped from the Arrow file
+_worker_data: Optional[pl.DataFrame] = None
 
 
 def train_strategy(
@@ -12,7 +40,40 @@ def train_strategy(
     ranges: dict,
     split=0.8,
     test_size=None,
+    n_jobs=1,
+    search="grid",
+    halving_factor=3,
+    budget=100,
+    seed=0,
+    store: Union[ResultStore, str, None] = None,
+    leaderboard: Optional[Leaderboard] = None,
 ) -> Tuple[Tuple, BacktestResults, BacktestResults, pl.DataFrame, pl.DataFrame]:
+    """
+    Best params of backtester_class over the grid of ranges on the data
+    before the cutoff, and its results on the training and test parts.
+    search="grid" runs every combination, search="halving" only the best
+    ones on the whole training window (see _successive_halving).
+    search="random" and "bayes" run budget combinations, drawn uniformly or
+    by a parzen estimator of the results so far, the same for the same seed.
+    Their ranges may be Intervals of continuous values. n_jobs > 1 (-1 for
+    every core) runs them in as many worker processes, with the same results
+    as the serial run. With a store (a ResultStore or the path of its file),
+    the combinations already stored for the same data and cutoff are not
+    run again and the others are stored as they complete. Only the metrics
+    of the best combinations are kept while sweeping, pass an empty Leaderboard
+    to get its top_k of them and the scalar metrics of every run as a DataFrame.
+    """
+    if search not in SEARCHES:
+        raise ValueError(f"Unknown search {search}, expected one of {SEARCHES}")
+    if search == "halving" and not (
+        isinstance(halving_factor, int) and halving_factor >= 2
+    ):
+        raise ValueError(f"halving_factor must be an int >= 2, not {halving_factor}")
+    if search in ("random", "bayes") and budget < 1:
+        raise ValueError(f"budget must be at least 1, not {budget}")
+    if leaderboard is not None and len(leaderboard):
+        # its best could be a combination of another sweep, never run here
+        raise ValueError("train_strategy needs an empty Leaderboard")
     if not ranges:
         return None, None, None, None, None
 
@@ -21,30 +82,251 @@ def train_strategy(
     else:
         cutoff = len(data) - test_size
 
-    keys, values = zip(*ranges.items())
-    param_combinations = [dict(zip(keys, v)) for v in product(*values)]
-
-    results = {}
+    if isinstance(store, str):
+        # the store opened here is closed here, even when the sweep is interrupted
+        with ResultStore(store) as path_store:
+            return train_strategy(
+                data,
+                backtester_class,
+                ranges,
+                split=split,
+                test_size=test_size,
+                n_jobs=n_jobs,
+                search=search,
+                halving_factor=halving_factor,
+                budget=budget,
+                seed=seed,
+                store=path_store,
+                leaderboard=leaderboard,
+            )
+    evaluate = partial(
+        _evaluate,
+        data,
+        backtester_class,
+        n_jobs=n_jobs,
+        store=store,
+        dataset=dataset_fingerprint(data) if store is not None else None,
+    )
 
-    for params in param_combinations:
-        backtester = backtester_class(data.clone(), **params, cutoff_end=cutoff)
-        train_result = backtester.run()
+    keys, values = zip(*ranges.items())
+    rng = np.random.default_rng(seed)
+    if search == "random":
+        param_combinations = random_combinations(ranges, budget, rng)
+    elif search == "bayes":
+        param_combinations = random_combinations(
+            ranges, min(budget, max(2, int(budget * BAYES_STARTUP))), rng
+        )
+    elif any(isinstance(value, Interval) for value in values):
+        raise ValueError(f"Intervals need a random or bayes search, not {search}")
+    else:
+        # a generator, the grid is only built SWEEP_CHUNK combinations at a time
+        param_combinations = (dict(zip(keys, v)) for v in product(*values))
 
-        results[params.values()] = train_result
+    if search == "halving":
+        param_combinations = _successive_halving(
+            evaluate, list(param_combinations), cutoff, halving_factor
+        )
+    if leaderboard is None:
+        leaderboard = Leaderboard()
+    explored, scores = [], []
+    for chunk in _chunks(param_combinations, SWEEP_CHUNK):
+        metrics = evaluate(chunk, cutoff)
+        leaderboard.add(chunk, metrics)
+        if search == "bayes":
+            explored += chunk
+            scores += [result.excess_return_vs_buy_and_hold for result in metrics]
 
-    best_combination = max(
-        results, key=lambda x: results[x].excess_return_vs_buy_and_hold
-    )
-    train_result = results[best_combination]
+    while search == "bayes" and len(explored) < budget:
+        number = min(BAYES_BATCH, budget - len(explored))
+        proposals = parzen_proposals(ranges, explored, scores, number, rng)
+        if not proposals:
+            break
+        metrics = evaluate(proposals, cutoff)
+        leaderboard.add(proposals, metrics)
+        explored += proposals
+        scores += [result.excess_return_vs_buy_and_hold for result in metrics]
+    best_combination = tuple(leaderboard.best[0][0].values())
 
+    # only the winner needs its trades and value curves
     params_test = dict(zip(keys, best_combination))
+    backtester = backtester_class(data.clone(), **params_test, cutoff_end=cutoff)
+    train_result = backtester.run()
+
     backtester = backtester_class(data.clone(), cutoff_begin=cutoff, **params_test)
     test_results = backtester.run()
 
     return (
-        tuple(best_combination),
+        best_combination,
         train_result,
         test_results,
         data[0:cutoff],
         data[cutoff:],
     )
+
+
+def _chunks(param_combinations: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    iterator = iter(param_combinations)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _successive_halving(
+    evaluate: Callable, param_combinations: List[dict], cutoff: int, halving_factor
+) -> List[dict]:
+    """
+    The combinations left for the whole training window by successive
+    halving. Every combination is run on the first cutoff / halving_factor**k
+    bars, the best 1 / halving_factor of them on halving_factor times more
+    bars, and so on. k is as large as the grid allows while the first prefix
+    keeps HALVING_MIN_BARS bars. Ties keep the grid order, like the max of
+    the grid search.
+    """
+    rungs = 0
+    while (
+        halving_factor ** (rungs + 1) <= len(param_combinations)
+        and cutoff // halving_factor ** (rungs + 1) >= HALVING_MIN_BARS
+    ):
+        rungs += 1
+
+    for rung in range(rungs, 0, -1):
+        prefix_end = cutoff // halving_factor**rung
+        metrics = evaluate(param_combinations, prefix_end)
+        ranking = sorted(
+            range(len(param_combinations)),
+            key=lambda i: metrics[i].excess_return_vs_buy_and_hold,
+            reverse=True,
+        )
+        kept = -(-len(param_combinations) // halving_factor)
+        param_combinations = [param_combinations[i] for i in sorted(ranking[:kept])]
+    return param_combinations
+
+
+def _evaluate(
+    data: pl.DataFrame,
+    backtester_class: Type[AbstractBacktest],
+    param_combinations: List[dict],
+    cutoff: int,
+    n_jobs: int,
+    store: Optional[ResultStore] = None,
+    dataset: Optional[str] = None,
+) -> List[BacktestMetrics]:
+    """
+    The metrics of the combinations trained up to cutoff, read from the store
+    when it has them, the others run and written to it chunk by chunk
+    """
+    if store is None:
+        return _run(data, backtester_class, param_combinations, cutoff, n_jobs)
+
+    stored = store.get_many(backtester_class, dataset, cutoff, param_combinations)
+    missing = [
+        params for params, metrics in zip(param_combinations, stored) if metrics is None
+    ]
+    checkpoint = partial(store.put_many, backtester_class, dataset, cutoff)
+    computed = iter(_run(data, backtester_class, missing, cutoff, n_jobs, checkpoint))
+    return [next(computed) if metrics is None else metrics for metrics in stored]
+
+
+def _run(
+    data: pl.DataFrame,
+    backtester_class: Type[AbstractBacktest],
+    param_combinations: List[dict],
+    cutoff: int,
+    n_jobs: int,
+    checkpoint: Optional[Callable] = None,
+) -> List[BacktestMetrics]:
+    """
+    The metrics of the combinations, checkpoint(chunk, metrics) being called
+    on each chunk of them as it completes
+    """
+    if not param_combinations:
+        return []
+    if n_jobs != 1:
+        return _run_parallel(
+            data, backtester_class, param_combinations, cutoff, n_jobs, checkpoint
+        )
+
+    backtester_class.precompute_combinations(data, param_combinations)
+    metrics: List[BacktestMetrics] = []
+    for start in range(0, len(param_combinations), CHECKPOINT_SIZE):
+        chunk = param_combinations[start : start + CHECKPOINT_SIZE]
+        chunk_metrics = [
+            _run_metrics(data, backtester_class, params, cutoff) for params in chunk
+        ]
+        if checkpoint is not None:
+            checkpoint(chunk, chunk_metrics)
+        metrics += chunk_metrics
+    return metrics
+
+
+def _run_metrics(
+    data: pl.DataFrame,
+    backtester_class: Type[AbstractBacktest],
+    params: dict,
+    cutoff: int,
+) -> BacktestMetrics:
+    backtester = backtester_class(data.clone(), **params, cutoff_end=cutoff)
+    return backtester.run(mode="metrics")  # type: ignore
+
+
+def _run_parallel(
+    data: pl.DataFrame,
+    backtester_class: Type[AbstractBacktest],
+    param_combinations: List[dict],
+    cutoff: int,
+    n_jobs: int,
+    checkpoint: Optional[Callable] = None,
+) -> List[BacktestMetrics]:
+    """
+    The metrics of every combination, in order, computed by n_jobs worker
+    processes over contiguous chunks of the grid. data is written once to an
+    uncompressed Arrow file that the workers memory map, so it is neither
+    pickled per task nor copied per worker.
+    """
+    n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+    chunk_size = -(-len(param_combinations) // (4 * n_jobs))
+    chunks = [
+        param_combinations[i : i + chunk_size]
+        for i in range(0, len(param_combinations), chunk_size)
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "data.arrow")
+        data.write_ipc(path)
+        # forked children of a process running polars threads can deadlock
+        with ProcessPoolExecutor(
+            max_workers=min(n_jobs, len(chunks)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(path,),
+        ) as executor:
+            chunks_metrics = executor.map(
+                _run_chunk,
+                [backtester_class] * len(chunks),
+                chunks,
+                [cutoff] * len(chunks),
+            )
+            metrics: List[BacktestMetrics] = []
+            for chunk, chunk_metrics in zip(chunks, chunks_metrics):
+                if checkpoint is not None:
+                    checkpoint(chunk, chunk_metrics)
+                metrics += chunk_metrics
+            return metrics
+
+
+def _init_worker(path: str):
+    global _worker_data
+    _worker_data = pl.read_ipc(path, memory_map=True)
+
+
+def _run_chunk(
+    backtester_class: Type[AbstractBacktest], param_combinations: List[dict], cutoff
+) -> List[BacktestMetrics]:
+    """
+    The metrics of a chunk of the grid in a worker, after precomputing the
+    indicators of its combinations in the worker indicator cache
+    """
+    backtester_class.precompute_combinations(_worker_data, param_combinations)  # type: ignore
+    return [
+        _run_metrics(_worker_data, backtester_class, params, cutoff)  # type: ignore
+        for params in param_combinations
+    ]
@@ -4,8 +4,15 @@ import numpy as np
 import polars as pl
 import pytest
 
-from src.mtal.backtesting.common import BacktestResults
-from src.mtal.backtesting.ma_cross_backtest import MACrossBacktester
+from src.mtal.backtesting.bands import BB, Keltner
+from src.mtal.backtesting.common import (
+    BacktestResults,
+    BarCursor,
+    trailing_stop_scan,
+)
+from src.mtal.backtesting.hma_on_rsi import HMA_RSI_CROSS
+from src.mtal.backtesting.ma_cross_backtest import MACrossBacktester, MACrossLag
+from src.mtal.profiling import collect_stats
 from src.mtal.utils import generate_pinescript
 
 
@@ -131,7 +138,7 @@ def test_backtester_no_trade(sample_data_no_exit: pl.DataFrame):
     assert results.win_rate == 0
     assert results.average_return == 0
     assert results.max_drawdown == 0
-    assert results.entry_dates == []
+    assert len(results.entry_dates) == 0
 
 
 def test_ema_cross_backtester_kelly_criterion_2_trades(sample_data: pl.DataFrame):
@@ -152,3 +159,194 @@ def test_ema_cross_backtester_kelly_criterion_2_trades(sample_data: pl.DataFrame
     assert len(results.b_n_h_history) == len(sample_data) * 2
     assert results.excess_return_vs_buy_and_hold == 0.18382375357777508
     assert results.kelly_criterion == 14.6552963242949
+
+
+def test_signals_match_is_enter_is_exit_run(sample_data: pl.DataFrame):
+    data = pl.concat([sample_data, sample_data])
+    vectorized = MACrossBacktester(data, short_ma=3, long_ma=20, cutoff_begin=10)
+    bar_by_bar = MACrossBacktester(data, short_ma=3, long_ma=20, cutoff_begin=10)
+    bar_by_bar.signals = lambda: None
+
+    results, expected = vectorized.run(), bar_by_bar.run()
+
+    assert results.entry_dates.tolist() == expected.entry_dates.tolist()
+    assert results.exit_dates.tolist() == expected.exit_dates.tolist()
+    assert results.entry_prices.tolist() == expected.entry_prices.tolist()
+    assert results.exit_prices.tolist() == expected.exit_prices.tolist()
+    assert results.value_history.tolist() == expected.value_history.tolist()
+    assert results.b_n_h_history.tolist() == expected.b_n_h_history.tolist()
+
+
+def test_bar_cursor_indexing(sample_data: pl.DataFrame):
+    cursor = BarCursor(sample_data, begin=10).until(20)
+    window = sample_data[10:21]
+
+    assert len(cursor) == len(window)
+    assert cursor[-1, "Close"] == window[-1, "Close"]
+    assert cursor[-2, "Open"] == window[-2, "Open"]
+    assert cursor[0, "Close"] == window[0, "Close"]
+    assert list(cursor["Close"]) == window["Close"].to_list()
+    assert list(cursor[-3:, "Volume"]) == window[-3:, "Volume"].to_list()
+    assert (cursor[-2]["Close"] == window[-2]["Close"].to_numpy()).all()
+
+    with pytest.raises(IndexError):
+        cursor[-12, "Close"]
+
+
+def test_trailing_stop_scan():
+    enter = np.array([False, True, False, False, False, True, False])
+    exit_active = np.ones(7, dtype=bool)
+    stop_level = np.array([5.0, 1.0, 3.0, 2.0, 4.0, 1.0, 2.0])
+    close = np.array([6.0, 6.0, 6.0, 6.0, 3.0, 6.0, 1.0])
+
+    entries, exits, stops = trailing_stop_scan(
+        enter, exit_active, stop_level, close, first=1, end=7
+    )
+
+    assert entries.tolist() == [False, True, False, False, False, True, False]
+    assert exits.tolist() == [False, False, False, False, True, False, True]
+    assert stops.tolist() == [0.0, 0.0, 3.0, 3.0, 0.0, 0.0, 0.0]
+
+
+def test_keltner_signals_match_is_exit_trailing_stop(sample_data: pl.DataFrame):
+    data = pl.concat([sample_data, sample_data]).with_columns(
+        pl.col("Close") + 2 * np.sin(np.arange(2 * len(sample_data)) / 15)
+    )
+    data = data.with_columns(
+        pl.max_horizontal("Open", "Close").alias("High"),
+        pl.min_horizontal("Open", "Close").alias("Low"),
+    )
+    vectorized = Keltner(data, span=10, window_ATR=5)
+    bar_by_bar = Keltner(data, span=10, window_ATR=5)
+    bar_by_bar.signals = lambda: None
+
+    results, expected = vectorized.run(), bar_by_bar.run()
+
+    assert results.trade_number == 2
+    assert results.entry_dates.tolist() == expected.entry_dates.tolist()
+    assert results.exit_dates.tolist() == expected.exit_dates.tolist()
+    assert results.value_history.tolist() == expected.value_history.tolist()
+
+
+def test_backtest_results_derived_from_trade_bars():
+    results = BacktestResults(
+        cash=1000,
+        fees=0,
+        buy_and_hold_return=0.5,
+        closes=np.array([100.0, 110.0, 120.0, 90.0, 150.0]),
+        entry_bars=np.array([1, 3]),
+        exit_bars=np.array([2, 5]),
+        entry_dates=np.array([]),
+        exit_dates=np.array([]),
+    )
+
+    assert results.entry_prices.tolist() == [110.0, 90.0]
+    assert results.exit_prices.tolist() == [120.0, 150.0]
+    assert results.trade_number == 2
+    assert results.value_history.tolist() == pytest.approx(
+        [1000, 1000, 1000, 1000 * 12 / 11, 1000 * 12 / 11, 1000 * 12 / 11 * 15 / 9]
+    )
+    assert results.b_n_h_history.tolist() == pytest.approx(
+        [1000, 1000, 1100, 1200, 900, 1500]
+    )
+    assert results.metrics()["pnl"] == pytest.approx(1000 * 12 / 11 * 15 / 9 - 1000)
+
+
+def test_buy_and_hold_curve_shared_between_runs(sample_data: pl.DataFrame):
+    first = MACrossBacktester(sample_data, short_ma=3, long_ma=20).run()
+    second = MACrossBacktester(sample_data.clone(), short_ma=5, long_ma=10).run()
+
+    assert first.b_n_h_history is second.b_n_h_history
+    assert first.b_n_h_history.tolist() == pytest.approx(
+        [1000] + (1000 * sample_data["Close"][:-1] / sample_data[0, "Close"]).to_list()
+    )
+    with pytest.raises(ValueError):
+        first.b_n_h_history[0] = 0
+
+    # runs on other windows of the same data get their own curve
+    window = MACrossBacktester(sample_data, short_ma=3, long_ma=20, cutoff_end=100)
+    assert window.run().b_n_h_history.tolist() == first.b_n_h_history[:101].tolist()
+
+
+@pytest.mark.parametrize("ma_type", ["ema", "hma"])
+def test_on_bar_matches_run(sample_data: pl.DataFrame, ma_type: str):
+    data = pl.concat([sample_data, sample_data])
+    expected = MACrossBacktester(data, short_ma=4, long_ma=12, ma_type=ma_type).run()
+    live = MACrossBacktester(data[:0], short_ma=4, long_ma=12, ma_type=ma_type)
+
+    decisions = [live.on_bar(bar) for bar in data[:-1].iter_rows(named=True)]
+
+    entries = [i for i, decision in enumerate(decisions) if decision == "enter"]
+    exits = [i for i, decision in enumerate(decisions) if decision == "exit"]
+    assert expected.trade_number > 0
+    assert entries == expected.entry_bars.tolist()
+    assert exits == expected.exit_bars[expected.exit_bars < len(data) - 1].tolist()
+
+
+@pytest.mark.parametrize(
+    "backtester_class, params",
+    [
+        (BB, {"window": 20, "window_dev": 1}),
+        (Keltner, {"span": 10, "window_ATR": 5}),
+        (HMA_RSI_CROSS, {"short_ma": 4, "long_ma": 9, "ma_type": "hma"}),
+        (HMA_RSI_CROSS, {"short_ma": 4, "long_ma": 9, "ma_type": "ema"}),
+    ],
+)
+def test_on_bar_matches_run_with_incremental_states(backtester_class, params):
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0.3, 1, size=400))
+    data = pl.DataFrame(
+        {
+            "Close": close,
+            "High": close + 0.3 * rng.random(400),
+            "Low": close - 0.3 * rng.random(400),
+            "Volume": rng.random(400),
+            "Close Time": pl.datetime_range(
+                datetime(2020, 1, 1), datetime(2021, 2, 3), "1d", eager=True
+            ),
+        }
+    )
+    expected = backtester_class(data, **params).run()
+    # compute_rsi does not build its columns on an empty frame
+    live = backtester_class(data[:1], **params)
+
+    decisions = [live.on_bar(bar) for bar in data[:-1].iter_rows(named=True)]
+
+    entries = [i for i, decision in enumerate(decisions) if decision == "enter"]
+    exits = [i for i, decision in enumerate(decisions) if decision == "exit"]
+    assert expected.trade_number > 1
+    assert entries == expected.entry_bars.tolist()
+    assert exits == expected.exit_bars[expected.exit_bars < len(data) - 1].tolist()
+
+
+def test_on_bar_not_supported(sample_data: pl.DataFrame):
+    backtester = MACrossLag(sample_data)
+
+    assert not backtester.supports_streaming()
+    with pytest.raises(TypeError, match="MACrossLag"):
+        backtester.on_bar({"Close": 100.0})
+    assert backtester.streamed_bars == 0
+
+    vwma = MACrossBacktester(sample_data, short_ma=3, long_ma=20, ma_type="vwma")
+    assert not vwma.supports_streaming()
+    with pytest.raises(TypeError, match="MACrossBacktester"):
+        vwma.on_bar({"Close": 100.0, "Volume": 1000.0})
+    assert vwma.streamed_bars == 0
+
+
+def test_collect_stats(sample_data: pl.DataFrame):
+    with collect_stats() as stats:
+        backtester = MACrossBacktester(sample_data, short_ma=4, ma_type="hma")
+        backtester.run()
+        bar_by_bar = MACrossBacktester(sample_data, short_ma=4, ma_type="hma")
+        bar_by_bar.signals = lambda: None
+        bar_by_bar.run()
+    MACrossBacktester(sample_data).run()
+
+    assert stats.indicator_calls == 4
+    assert stats.conversions == 0
+    assert stats.runs == 2
+    assert stats.bars == 2 * (len(sample_data) - 2)
+    assert stats.slices == 1
+    assert stats.indicator_time > 0 and stats.signal_time > 0
+    assert stats.bars_per_second > 0
@@ -0,0 +1,107 @@
+from datetime import date
+
+import numpy as np
+import polars as pl
+import pytest
+
+from src.mtal.backtesting.batch import batch_backtest, ma_cross_sweep
+from src.mtal.backtesting.ma_atr import MAATR
+from src.mtal.backtesting.ma_cross_backtest import (
+    MACrossBacktester,
+    MACrossFakeBarBacktester,
+)
+
+
+@pytest.fixture
+def sample_panel():
+    dates = pl.date_range(
+        start=date(2020, 1, 1), end=date(2020, 12, 31), interval="1d", eager=True
+    )
+    frames = []
+    for i, pair in enumerate(["BTCUSDT", "ETHUSDT", "SOLUSDT"]):
+        prices = 100 + 10 * np.sin(np.arange(len(dates)) / (10 + 5 * i))
+        df = pl.DataFrame({"date": dates, "Open": prices})
+        df = df.with_columns(
+            pl.col("Open").shift(-1).alias("Close"),
+            pl.col("date").alias("Open Time"),
+            pl.col("date").shift(-1).alias("Close Time"),
+            (pl.col("Open") * 10).alias("Volume"),
+            pl.lit(pair).alias("Pair"),
+        )
+        df = df.with_columns(
+            pl.max_horizontal("Open", "Close").alias("High"),
+            pl.min_horizontal("Open", "Close").alias("Low"),
+        )
+        # pairs listed at different dates
+        frames.append(df[20 * i : -1])
+
+    return pl.concat(frames)
+
+
+@pytest.mark.parametrize(
+    "backtester_class, params",
+    [
+        (MACrossBacktester, {"short_ma": 3, "long_ma": 20}),
+        (MACrossBacktester, {"short_ma": 5, "long_ma": 12, "cutoff_begin": 50}),
+        (MACrossBacktester, {"short_ma": 4, "long_ma": 15, "ma_type": "vwma"}),
+        (MACrossBacktester, {"short_ma": 3, "long_ma": 20, "ma_type": "hma"}),
+        (MAATR, {"short_ma": 3, "long_ma": 10}),
+    ],
+)
+def test_batch_backtest_matches_single_runs(sample_panel, backtester_class, params):
+    results = batch_backtest(sample_panel, backtester_class, params)
+
+    assert results["Pair"].to_list() == ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+    for i, frame in enumerate(sample_panel.partition_by("Pair", maintain_order=True)):
+        expected = backtester_class(frame, **params).run()
+        assert expected.trade_number > 0
+        assert results[i, "trade_number"] == expected.trade_number
+        for column in results.columns[1:]:
+            assert results[i, column] == pytest.approx(getattr(expected, column))
+
+
+@pytest.mark.parametrize("ma_type", ["ema", "vwma"])
+def test_panel_signals_match_single_signals(sample_panel, ma_type):
+    params = {"short_ma": 3, "long_ma": 20, "ma_type": ma_type, "cutoff_begin": 10}
+    # one row per date, the pairs interleaved
+    panel = sample_panel.sort("date", maintain_order=True)
+
+    enter, exit = MACrossBacktester.panel_signals(panel, "Pair", **params)
+
+    for pair in ["BTCUSDT", "ETHUSDT", "SOLUSDT"]:
+        rows = (panel["Pair"] == pair).to_numpy()
+        frame = panel.filter(pl.col("Pair") == pair)
+        expected_enter, expected_exit = MACrossBacktester(frame, **params).signals()
+        assert expected_enter.any()
+        np.testing.assert_array_equal(enter[rows], expected_enter)
+        np.testing.assert_array_equal(exit[rows], expected_exit)
+    assert batch_backtest(panel, MACrossBacktester, params).equals(
+        batch_backtest(sample_panel, MACrossBacktester, params)
+    )
+
+
+def test_batch_backtest_needs_signals(sample_panel):
+    with pytest.raises(ValueError):
+        batch_backtest(sample_panel, MACrossFakeBarBacktester)
+
+
+@pytest.mark.parametrize("ma_type", ["ema", "hma"])
+def test_ma_cross_sweep_matches_single_runs(sample_panel, ma_type):
+    frame = sample_panel.partition_by("Pair", maintain_order=True)[1]
+
+    grid = ma_cross_sweep(frame, [2, 3, 5], range(8, 30, 7), ma_type, cutoff_end=250)
+
+    assert grid.select("short_ma", "long_ma").rows()[:5] == [
+        (2, 8),
+        (2, 15),
+        (2, 22),
+        (2, 29),
+        (3, 8),
+    ]
+    for row in grid.iter_rows(named=True):
+        expected = MACrossBacktester(
+            frame, row["short_ma"], row["long_ma"], ma_type, cutoff_end=250
+        ).run()
+        assert row["trade_number"] == expected.trade_number
+        for name, value in expected.metrics().items():
+            assert row[name] == pytest.approx(value)
@@ -0,0 +1,84 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from src.mtal.analysis import compute_ema, compute_hma
+from src.mtal.cache import IndicatorCache, fingerprint, indicator_cache
+
+
+@pytest.fixture
+def sample_data():
+    close = 100 + np.cumsum(np.sin(np.arange(200) / 5))
+    return pl.DataFrame({"Close": close, "Volume": np.full(200, 10.0)})
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    indicator_cache.clear()
+    yield
+    indicator_cache.clear()
+
+
+def test_indicator_computed_once_per_dataset(sample_data: pl.DataFrame):
+    first = compute_hma(sample_data, span=9)
+    misses = indicator_cache.misses
+
+    second = compute_hma(sample_data.clone().with_columns(pl.lit(1).alias("x")), 9)
+
+    assert indicator_cache.misses == misses
+    assert second.drop("x").equals(first)
+    assert second["hma_9"].to_list() == first["hma_9"].to_list()
+
+
+def test_indicator_cache_keys_on_params_and_content(sample_data: pl.DataFrame):
+    compute_ema(sample_data, span=9)
+    compute_ema(sample_data, span=10)
+    shifted = compute_ema(sample_data.with_columns(pl.col("Close") + 1), span=9)
+
+    assert len(indicator_cache) == 3
+    expected = (sample_data["Close"] + 1).ewm_mean(
+        span=9, adjust=False, ignore_nulls=True
+    )
+    assert shifted["ema_9"].to_list() == expected.to_list()
+
+
+def test_indicator_cache_replaces_rewritten_columns(sample_data: pl.DataFrame):
+    df = compute_hma(compute_hma(sample_data, span=4), span=16)
+    expected = compute_hma(sample_data, span=16)
+
+    assert df["data_hull"].equals(expected["data_hull"])
+
+
+def test_indicator_cache_lru_memory_budget():
+    column = pl.Series("a", np.zeros(100))
+    cache = IndicatorCache(max_bytes=2 * column.estimated_size())
+
+    cache.put("a", [column])
+    cache.put("b", [column])
+    cache.get("a")
+    cache.put("c", [column])
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.size == 2 * column.estimated_size()
+
+    cache.resize(0)
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_fingerprint_memoized_on_column_buffers(sample_data: pl.DataFrame, monkeypatch):
+    expected = fingerprint(sample_data, ["Close"])
+    hashes = []
+    monkeypatch.setattr(
+        pl.Series, "hash", lambda self, *args, **kwargs: hashes.append(self) or 1 / 0
+    )
+
+    assert fingerprint(sample_data.clone(), ["Close"]) == expected
+    assert fingerprint(sample_data.with_columns(x=pl.lit(1)), ["Close"]) == expected
+    assert hashes == []
+
+    monkeypatch.undo()
+    changed = sample_data.clone()
+    changed[0, "Close"] = 0.0
+    assert fingerprint(changed, ["Close"]) != expected
+    assert fingerprint(sample_data, ["Close"]) == expected
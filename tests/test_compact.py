@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from src.mtal.analysis import (
+    compute_anchored_obv,
+    compute_hma,
+    compute_mas,
+    compute_rsi,
+)
+from src.mtal.cache import indicator_cache
+from src.mtal.compact import INTERMEDIATE_COLUMNS, compact_frame, compact_mode
+
+
+@pytest.fixture
+def sample_data():
+    close = 100 + np.cumsum(np.sin(np.arange(200) / 5))
+    start = datetime(2020, 1, 5)
+    return pl.DataFrame(
+        {
+            "Close Time": [start + timedelta(weeks=i) for i in range(200)],
+            "Close": close,
+            "Volume": np.arange(200, dtype=float) % 7 + 1,
+        }
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    indicator_cache.clear()
+    yield
+    indicator_cache.clear()
+
+
+def test_compact_mode_indicators(sample_data: pl.DataFrame):
+    with compact_mode():
+        compact = compute_hma(compute_rsi(sample_data), span=9)
+        mas = compute_mas(sample_data, [5, 10])
+    full = compute_hma(compute_rsi(sample_data), span=9)
+
+    assert not set(INTERMEDIATE_COLUMNS) & set(compact.columns)
+    assert {"Change", "RS", "data_hull"} <= set(full.columns)
+    for name in ["RSI", "ema5", "Volume_MA", "hma_9"]:
+        assert compact[name].dtype == pl.Float32
+        assert compact[name].equals(full[name].cast(pl.Float32))
+    assert mas.select("ema_5", "ema_10").dtypes == [pl.Float32, pl.Float32]
+    assert compact["Close"].dtype == pl.Float64
+
+
+def test_compact_frame(sample_data: pl.DataFrame):
+    df = compact_frame(compute_rsi(sample_data))
+
+    assert df["Close Time"].dtype == pl.Int64
+    epoch = datetime(2020, 1, 5) - datetime(1970, 1, 1)
+    assert df["Close Time"][0] == epoch // timedelta(milliseconds=1)
+    assert df["Close"].dtype == pl.Float32
+    assert not set(INTERMEDIATE_COLUMNS) & set(df.columns)
+    assert compute_anchored_obv(df)["Anchored_OBV"].equals(
+        compute_anchored_obv(sample_data)["Anchored_OBV"]
+    )
@@ -1,13 +1,37 @@
+from datetime import date
+
+import numpy as np
 import polars as pl
+import pytest
 from polars.testing import assert_series_equal
+from ta.trend import WMAIndicator
+from ta.volatility import AverageTrueRange, BollingerBands, KeltnerChannel
 
+from src.mtal import analysis
 from src.mtal.analysis import (
+    ANCHOR_MONTHS,
+    MA_FUNCTIONS,
     compute_anchored_obv,
+    compute_anchored_obvs,
+    compute_atr,
+    compute_BB,
     compute_ema,
+    compute_heikin_ashin,
     compute_hma,
+    compute_keltner_high,
+    compute_keltner_low,
+    compute_ma_matrix,
+    compute_mas,
+    compute_renko,
+    compute_renko_bricks,
     compute_rsi,
     compute_vzo,
+    indicator_spec,
+    precompute_indicators,
+    renko_bricks,
+    weighted_moving_average,
 )
+from src.mtal.cache import indicator_cache
 from src.mtal.utils import get_ma_names
 
 
@@ -123,12 +147,26 @@ def test_compute_hull_moving_average():
     df_hma = compute_hma(df, span=span)
 
     expected_hma = pl.Series(
-        [0, 53383, 51607, 67087, 70982, 68034, 66893, 72696, 68542, 64800],
+        [
+            0.0,
+            53383.666666666664,
+            51607.0,
+            67087.33333333333,
+            70982.33333333333,
+            68034.33333333333,
+            66893.33333333333,
+            72696.66666666667,
+            68542.33333333333,
+            64800.0,
+        ],
         # index=df.index,
     )
 
     assert_series_equal(
-        df_hma[get_ma_names(span, prefix="hma")], expected_hma, check_names=False
+        df_hma[get_ma_names(span, prefix="hma")],
+        expected_hma,
+        check_names=False,
+        rtol=1e-12,
     )
 
 
@@ -212,3 +250,198 @@ def test_compute_anchored_obv():
     assert all(
         result_pd["Anchored_OBV"] == expected_obv_values
     ), "OBV values do not match expected values"
+
+
+def test_band_indicators_match_ta():
+    close = 100 + np.cumsum(np.sin(np.arange(120) / 7))
+    df = pl.DataFrame({"Close": close, "High": close + 1.5, "Low": close - 0.5})
+    df_pd = df.to_pandas()
+
+    bb = BollingerBands(df_pd["Close"], window=20, window_dev=2)
+    keltner = KeltnerChannel(
+        df_pd["High"],
+        df_pd["Low"],
+        df_pd["Close"],
+        window=20,
+        window_atr=5,
+        original_version=False,
+    )
+    atr = AverageTrueRange(df_pd["High"], df_pd["Low"], df_pd["Close"], window=14)
+
+    expected = {
+        "BB_hband": bb.bollinger_hband(),
+        "BB_lband": bb.bollinger_lband(),
+        "keltner_low": keltner.keltner_channel_lband(),
+        "keltner_high": keltner.keltner_channel_hband(),
+        "ATR": atr.average_true_range(),
+    }
+    df = compute_BB(df)
+    df = compute_keltner_low(df, span=20, window_ATR=5)
+    df = compute_keltner_high(df, span=20, window_ATR=5)
+    df = compute_atr(df, span=14)
+
+    for name, values in expected.items():
+        assert_series_equal(
+            df[name].fill_null(np.nan),
+            pl.Series(values.to_numpy()),
+            check_names=False,
+            rtol=1e-9,
+        )
+
+
+@pytest.mark.parametrize("span", [1, 2, 9, 256, 300])
+def test_weighted_moving_average_matches_ta(span: int):
+    close = 5e4 + np.cumsum(np.sin(np.arange(2600) / 9)) * 300
+    close[5] = np.nan
+
+    expected = WMAIndicator(pl.Series(close).to_pandas(), window=span).wma()
+
+    np.testing.assert_allclose(
+        weighted_moving_average(close, span), expected.to_numpy(), rtol=1e-10
+    )
+
+
+@pytest.mark.parametrize("ma_type", ["ema", "vwma", "hma", "ehma"])
+def test_compute_ma_matrix_matches_single_spans(ma_type: str):
+    close = 100 + np.cumsum(np.sin(np.arange(150) / 6))
+    df = pl.DataFrame({"Close": close, "Volume": 10 + np.cos(np.arange(150))})
+    spans = [4, 9, 16, 25]
+
+    matrix = compute_ma_matrix(df, spans, ma_type=ma_type)
+
+    assert matrix.shape == (len(spans), len(df))
+    for row, span in zip(matrix, spans):
+        single = MA_FUNCTIONS[ma_type](df, span)[get_ma_names(span, prefix=ma_type)]
+        np.testing.assert_array_equal(row, single.cast(pl.Float64).to_numpy())
+
+
+def test_compute_mas_fills_indicator_cache():
+    df = pl.DataFrame({"Close": 100 + np.cumsum(np.sin(np.arange(150) / 6))})
+    indicator_cache.clear()
+
+    compute_mas(df, [5, 10, 20], ma_type="hma")
+    misses = indicator_cache.misses
+    df_hma = compute_hma(df, span=10)
+
+    assert indicator_cache.misses == misses
+    assert df_hma.columns == ["Close", "data_hull", "hma_10"]
+
+
+def test_renko_bricks():
+    prices, directions = renko_bricks(
+        [10.0, 11.0, 12.5, 11.0, 9.0], np.full(5, 1.0), [1.0, 2.0]
+    )
+
+    assert prices.tolist() == [
+        [10.0, 11.0, 12.0, 11.0, 10.0],
+        [10.0, 10.0, 12.0, 12.0, 10.0],
+    ]
+    assert directions.tolist() == [[0, 1, 1, -1, -1], [0, 0, 1, 0, -1]]
+
+
+def test_renko_bricks_factor_vector_matches_scalar_scan(monkeypatch):
+    close = 100 + np.cumsum(np.sin(np.arange(300) / 6))
+    df = pl.DataFrame({"Close": close, "High": close + 1, "Low": close - 1})
+    # the ATR is 0 on the first bars, the bricks of size 0 moving up
+    atr = compute_atr(df, 14)["ATR"].to_numpy()
+    factors = np.linspace(0.25, 4, 16)
+
+    prices, directions = renko_bricks(close, atr, factors)
+    monkeypatch.setattr(analysis, "RENKO_VECTOR_FACTORS", 1)
+    vector_prices, vector_directions = renko_bricks(close, atr, factors)
+
+    assert np.array_equal(vector_prices, prices)
+    assert np.array_equal(vector_directions, directions)
+    assert (directions[:, 1:13] == 1).all()
+
+
+def test_compute_renko_bricks_fills_indicator_cache():
+    close = 100 + np.cumsum(np.sin(np.arange(150) / 6))
+    df = pl.DataFrame({"Close": close, "High": close + 1, "Low": close - 1})
+    factors = [0.5, 1.0, 2.0]
+    indicator_cache.clear()
+
+    prices, directions = compute_renko_bricks(df, 14, factors)
+    misses = indicator_cache.misses
+    singles = [compute_renko(df, 14, factor) for factor in factors]
+
+    assert indicator_cache.misses == misses
+    indicator_cache.clear()
+    for row, factor in enumerate(factors):
+        expected = compute_renko(df, 14, factor)
+        assert singles[row].equals(expected)
+        assert prices[row].tolist() == expected["Renko_Price"].to_list()
+        assert directions[row].tolist() == expected["Direction"].to_list()
+
+
+def test_compute_anchored_obvs_fills_indicator_cache():
+    close_time = pl.date_range(
+        date(2021, 11, 1), date(2023, 2, 1), interval="1w", eager=True
+    )
+    close = 100 + np.cumsum(np.sin(np.arange(len(close_time)) / 3))
+    df = pl.DataFrame(
+        {"Close Time": close_time, "Close": close, "Volume": np.full(len(close), 10)}
+    )
+    indicator_cache.clear()
+
+    anchored_obvs = compute_anchored_obvs(df)
+    misses = indicator_cache.misses
+    singles = {period: compute_anchored_obv(df, period) for period in ANCHOR_MONTHS}
+
+    assert indicator_cache.misses == misses
+    indicator_cache.clear()
+    for period, single in singles.items():
+        expected = compute_anchored_obv(df, period)
+        assert single.equals(expected)
+        assert anchored_obvs[period].to_list() == expected["Anchored_OBV"].to_list()
+    year_starts = anchored_obvs.filter(close_time.dt.year().diff() == 1)
+    assert year_starts["1Y"].to_list() == [0, 0]
+
+    with pytest.raises(ValueError):
+        compute_anchored_obv(df, "2W")
+
+
+def test_compute_heikin_ashin_recursion():
+    df = pl.DataFrame(
+        {
+            "Open": [10.0, 11.0, 12.0, 11.5],
+            "High": [11.5, 12.5, 12.5, 12.0],
+            "Low": [9.5, 10.5, 11.0, 10.0],
+            "Close": [11.0, 12.0, 11.5, 10.5],
+        }
+    )
+
+    df_ha = compute_heikin_ashin(df)
+
+    assert df_ha["ha_Close"].to_list() == [10.5, 11.5, 11.75, 11.0]
+    assert df_ha["ha_Open"].to_list() == [10.0, 10.25, 10.875, 11.3125]
+    assert df_ha["ha_High"].to_list() == [11.5, 12.5, 12.5, 12.0]
+    assert df_ha["ha_Low"].to_list() == [9.5, 10.25, 10.875, 10.0]
+
+
+def test_precompute_indicators_merges_specs():
+    close = 100 + np.cumsum(np.sin(np.arange(150) / 6))
+    df = pl.DataFrame(
+        {"Open": close, "Close": close, "High": close + 1, "Low": close - 1}
+    )
+    specs = [
+        indicator_spec(compute_keltner_low, span=20),
+        indicator_spec(compute_keltner_low, span=20, window_ATR=3),
+        indicator_spec(compute_keltner_high, span=20),
+        indicator_spec(compute_atr, span=3),
+        indicator_spec(compute_BB, window=20),
+        indicator_spec(compute_hma, span=9),
+        indicator_spec(compute_heikin_ashin),
+    ]
+    indicator_cache.clear()
+
+    precompute_indicators(df, specs)
+    misses = indicator_cache.misses
+    results = [spec(df) for spec in specs]
+
+    assert specs[0] == specs[1]
+    assert len(indicator_cache) == len(specs) - 1
+    assert indicator_cache.misses == misses
+    indicator_cache.clear()
+    for spec, result in zip(specs, results):
+        assert result.equals(spec(df))
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import polars as pl
+import pytest
+
+from src.mtal.analysis import compute_atr, compute_BB, compute_hma, compute_rsi
+from src.mtal.incremental import (
+    ATRState,
+    BBState,
+    HMAState,
+    RSIState,
+    indicator_state_from_dict,
+)
+
+
+@pytest.fixture
+def sample_data():
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(size=500))
+    return pl.DataFrame(
+        {
+            "Close": close,
+            "High": close + rng.random(500),
+            "Low": close - rng.random(500),
+            "Volume": rng.random(500),
+        }
+    )
+
+
+def bars(df: pl.DataFrame):
+    return list(zip(df["High"], df["Low"], df["Close"]))
+
+
+@pytest.mark.parametrize("window", [2, 14, 50])
+def test_states_match_batch_indicators(sample_data: pl.DataFrame, window: int):
+    rsi = RSIState(window)
+    atr = ATRState(window)
+    bb = BBState(window)
+
+    rsi_values = [rsi.update(close) for close in sample_data["Close"]]
+    atr_values = [atr.update(*bar) for bar in bars(sample_data)]
+    bb_values = np.array([bb.update(close) for close in sample_data["Close"]])
+
+    expected_rsi = compute_rsi(sample_data, window)["RSI"].fill_null(np.nan)
+    expected_bb = compute_BB(sample_data, window).fill_null(np.nan)
+    np.testing.assert_array_equal(rsi_values, expected_rsi.to_numpy())
+    assert atr_values == compute_atr(sample_data, window)["ATR"].to_list()
+    np.testing.assert_array_equal(bb_values[:, 1], expected_bb["BB_mid"].to_numpy())
+    for i, name in [(0, "BB_hband"), (2, "BB_lband")]:
+        np.testing.assert_allclose(
+            bb_values[:, i], expected_bb[name].to_numpy(), rtol=1e-10
+        )
+
+
+@pytest.mark.parametrize(
+    "state, update",
+    [
+        (lambda: RSIState(14), lambda state, bar: state.update(bar[2])),
+        (lambda: ATRState(14), lambda state, bar: state.update(*bar)),
+        (lambda: BBState(20), lambda state, bar: state.update(bar[2])),
+        (lambda: HMAState(16), lambda state, bar: state.update(bar[2])),
+    ],
+)
+def test_states_resume_from_dict(sample_data: pl.DataFrame, state, update):
+    full_state = state()
+    expected = [update(full_state, bar) for bar in bars(sample_data)]
+
+    resumed = state()
+    values = [update(resumed, bar) for bar in bars(sample_data)[:10]]
+    resumed = indicator_state_from_dict(json.loads(json.dumps(resumed.to_dict())))
+    values += [update(resumed, bar) for bar in bars(sample_data)[10:]]
+
+    np.testing.assert_array_equal(values, expected)
+    assert resumed.to_dict() == full_state.to_dict()
+
+
+def test_hma_state_matches_batch(sample_data: pl.DataFrame):
+    state = HMAState(16)
+
+    values = [state.update(close) for close in sample_data["Close"]]
+
+    assert values == compute_hma(sample_data, 16)["hma_16"].to_list()
@@ -0,0 +1,45 @@
+from itertools import product
+
+import numpy as np
+
+from src.mtal.search import (
+    Interval,
+    grid_size,
+    parzen_proposals,
+    random_combinations,
+)
+
+
+def test_random_combinations_of_grid():
+    ranges = {"a": range(3), "b": ["x", "y"], "c": range(10, 14)}
+    grid = [dict(zip(ranges, values)) for values in product(*ranges.values())]
+
+    drawn = random_combinations(ranges, 10, np.random.default_rng(0))
+
+    assert grid_size(ranges) == 24
+    assert len(drawn) == 10
+    assert drawn == [combination for combination in grid if combination in drawn]
+    assert random_combinations(ranges, 100, np.random.default_rng(0)) == grid
+
+
+def test_random_combinations_of_intervals():
+    ranges = {"a": range(3), "factor": Interval(0.5, 2.0)}
+
+    drawn = random_combinations(ranges, 50, np.random.default_rng(0))
+
+    assert grid_size(ranges) is None
+    assert all(0.5 <= combination["factor"] <= 2.0 for combination in drawn)
+    assert {combination["a"] for combination in drawn} == {0, 1, 2}
+
+
+def test_parzen_proposals_favor_good_region():
+    ranges = {"a": range(20), "factor": Interval(0.0, 1.0)}
+    rng = np.random.default_rng(0)
+    combinations = random_combinations(ranges, 40, rng)
+    scores = [-abs(c["a"] - 15) - abs(c["factor"] - 0.8) for c in combinations]
+
+    proposals = parzen_proposals(ranges, combinations, scores, 8, rng)
+
+    assert len(proposals) == 8
+    assert not [proposal for proposal in proposals if proposal in combinations]
+    assert np.mean([proposal["a"] for proposal in proposals]) > 10
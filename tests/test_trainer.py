@@ -1,3 +1,4 @@
+import sqlite3
 from datetime import date
 
 import numpy as np
@@ -5,8 +6,15 @@ import pandas as pd
 import polars as pl
 import pytest
 
+from src.mtal.backtesting.bands import BB_silico
+from src.mtal.backtesting.common import BacktestMetrics
 from src.mtal.backtesting.ma_cross_backtest import MACrossBacktester
 from src.mtal.backtesting.vzo_rsi import VZO_RSI
+from src.mtal import trainer
+from src.mtal.leaderboard import Leaderboard
+from src.mtal.profiling import collect_stats
+from src.mtal.result_store import ResultStore
+from src.mtal.search import Interval
 from src.mtal.trainer import train_strategy
 
 
@@ -109,3 +117,227 @@ def test_trainer_fixed_size_test_window(sample_data: pl.DataFrame):
     assert test_results.trade_number == 1
     assert test_results.exit_dates[0] == pd.Timestamp("2020-07-17 00:00:00")
     assert len(train_df) + 1 == len(test_df)
+
+
+def test_run_metrics_mode_matches_full_run(sample_data: pl.DataFrame):
+    full = MACrossBacktester(sample_data, short_ma=3, long_ma=20).run()
+    metrics = MACrossBacktester(sample_data, short_ma=3, long_ma=20).run(mode="metrics")
+
+    assert isinstance(metrics, BacktestMetrics)
+    assert metrics.trade_number == 2
+    assert metrics.metrics() == full.metrics()
+
+    with pytest.raises(ValueError):
+        MACrossBacktester(sample_data, short_ma=3, long_ma=20).run(mode="history")
+
+
+def test_trainer_parallel_matches_serial(sample_data: pl.DataFrame):
+    ranges = {"short_ma": range(2, 8), "long_ma": range(10, 30, 4)}
+
+    serial = train_strategy(sample_data, MACrossBacktester, ranges, split=0.6)
+    parallel = train_strategy(
+        sample_data, MACrossBacktester, ranges, split=0.6, n_jobs=2
+    )
+
+    assert parallel[0] == serial[0]
+    assert parallel[1].metrics() == serial[1].metrics()
+    assert parallel[2].metrics() == serial[2].metrics()
+
+
+def test_trainer_successive_halving(sample_data: pl.DataFrame):
+    ranges = {"short_ma": range(2, 8), "long_ma": range(10, 30, 4)}
+
+    with collect_stats() as grid_stats:
+        grid = train_strategy(sample_data, MACrossBacktester, ranges)
+    with collect_stats() as halving_stats:
+        halving = train_strategy(
+            sample_data, MACrossBacktester, ranges, search="halving"
+        )
+
+    assert halving[0] == grid[0]
+    assert halving[1].metrics() == grid[1].metrics()
+    assert halving_stats.bars < grid_stats.bars
+
+    with pytest.raises(ValueError):
+        train_strategy(sample_data, MACrossBacktester, ranges, search="exhaustive")
+
+
+@pytest.mark.parametrize("halving_factor", [1, 0, -2, 2.5])
+def test_trainer_rejects_invalid_halving_factor(
+    sample_data: pl.DataFrame, halving_factor
+):
+    ranges = {"short_ma": range(2, 8), "long_ma": range(10, 30, 4)}
+
+    with pytest.raises(ValueError, match="halving_factor"):
+        train_strategy(
+            sample_data,
+            MACrossBacktester,
+            ranges,
+            search="halving",
+            halving_factor=halving_factor,
+        )
+
+
+@pytest.mark.parametrize("search", ["random", "bayes"])
+def test_trainer_budgeted_search(sample_data: pl.DataFrame, search: str):
+    ranges = {"short_ma": range(2, 12), "long_ma": range(10, 40, 2)}
+
+    with collect_stats() as stats:
+        first = train_strategy(
+            sample_data, MACrossBacktester, ranges, search=search, budget=30, seed=3
+        )
+    second = train_strategy(
+        sample_data, MACrossBacktester, ranges, search=search, budget=30, seed=3
+    )
+
+    # the budget and the winner train and test runs
+    assert stats.runs == 30 + 2
+    assert first[0] == second[0]
+    assert first[1].metrics() == second[1].metrics()
+
+
+@pytest.mark.parametrize("search", ["random", "bayes"])
+@pytest.mark.parametrize("budget", [1, 2, 3])
+def test_trainer_runs_at_most_the_budget(
+    sample_data: pl.DataFrame, search: str, budget: int
+):
+    ranges = {"short_ma": range(2, 12), "long_ma": range(10, 40, 2)}
+
+    with collect_stats() as stats:
+        train_strategy(
+            sample_data, MACrossBacktester, ranges, search=search, budget=budget
+        )
+    assert stats.runs == budget + 2
+
+    for invalid in (0, -1):
+        with pytest.raises(ValueError, match="budget"):
+            train_strategy(
+                sample_data, MACrossBacktester, ranges, search=search, budget=invalid
+            )
+
+
+def test_trainer_intervals_need_sampled_search(sample_data: pl.DataFrame):
+    ranges = {"span": range(1, 3), "grey_zone_rsi": Interval(1.0, 3.0)}
+
+    best_params, _, _, _, _ = train_strategy(
+        sample_data, VZO_RSI, ranges, search="random", budget=5
+    )
+    assert 1.0 <= best_params[1] <= 3.0
+
+    with pytest.raises(ValueError):
+        train_strategy(sample_data, VZO_RSI, ranges)
+
+
+def test_trainer_result_store_resumes(sample_data: pl.DataFrame, tmp_path, monkeypatch):
+    ranges = {"short_ma": range(2, 8), "long_ma": range(10, 30, 4)}
+    path = str(tmp_path / "results.sqlite")
+    expected = train_strategy(sample_data, MACrossBacktester, ranges)
+
+    run_metrics = trainer._run_metrics
+
+    def interrupted(*args):
+        if len(ResultStore(path)) == 8:
+            raise KeyboardInterrupt
+        return run_metrics(*args)
+
+    monkeypatch.setattr(trainer, "CHECKPOINT_SIZE", 4)
+    monkeypatch.setattr(trainer, "_run_metrics", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        train_strategy(sample_data, MACrossBacktester, ranges, store=path)
+    monkeypatch.setattr(trainer, "_run_metrics", run_metrics)
+
+    with collect_stats() as stats:
+        resumed = train_strategy(sample_data, MACrossBacktester, ranges, store=path)
+    assert stats.runs == 30 - 8 + 2
+    assert resumed[0] == expected[0]
+    assert resumed[1].metrics() == expected[1].metrics()
+
+    wider = dict(ranges, long_ma=range(10, 34, 4))
+    with collect_stats() as stats:
+        train_strategy(sample_data, MACrossBacktester, wider, store=path)
+    assert stats.runs == 6 + 2
+    assert len(ResultStore(path)) == 36
+
+    with collect_stats() as stats:
+        train_strategy(sample_data, MACrossBacktester, ranges, test_size=50, store=path)
+    assert stats.runs == 30 + 2
+
+
+def test_trainer_closes_the_store_it_opens(
+    sample_data: pl.DataFrame, tmp_path, monkeypatch
+):
+    ranges = {"short_ma": range(2, 5), "long_ma": range(10, 20, 4)}
+    opened = []
+
+    class TrackedStore(ResultStore):
+        def __init__(self, path):
+            super().__init__(path)
+            opened.append(self)
+
+    monkeypatch.setattr(trainer, "ResultStore", TrackedStore)
+    train_strategy(
+        sample_data, MACrossBacktester, ranges, store=str(tmp_path / "a.sqlite")
+    )
+    with TrackedStore(str(tmp_path / "b.sqlite")) as store:
+        train_strategy(sample_data, MACrossBacktester, ranges, store=store)
+        assert len(store) == 9
+
+    assert len(opened) == 2
+    for store in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            len(store)
+
+
+def test_trainer_leaderboard(sample_data: pl.DataFrame, monkeypatch):
+    ranges = {"short_ma": range(2, 8), "long_ma": range(10, 30, 4)}
+    expected = train_strategy(sample_data, MACrossBacktester, ranges)
+
+    monkeypatch.setattr(trainer, "SWEEP_CHUNK", 4)
+    leaderboard = Leaderboard(top_k=3)
+    best_params, train_results, _, _, _ = train_strategy(
+        sample_data, MACrossBacktester, ranges, leaderboard=leaderboard
+    )
+
+    assert best_params == expected[0]
+    assert train_results.metrics() == expected[1].metrics()
+    assert len(leaderboard) == 30
+    assert tuple(leaderboard.best[0][0].values()) == best_params
+
+    frame = leaderboard.frame
+    assert frame.columns == ["short_ma", "long_ma", *BacktestMetrics.METRICS]
+    assert frame.select("short_ma", "long_ma").rows()[:2] == [(2, 10), (2, 14)]
+    top = frame.sort(
+        "excess_return_vs_buy_and_hold", descending=True, maintain_order=True
+    )
+    top_metrics = top.head(3).select(BacktestMetrics.METRICS).to_dicts()
+    assert [metrics.metrics() for _, metrics in leaderboard.best] == top_metrics
+
+    with pytest.raises(ValueError):
+        Leaderboard(top_k=0)
+    with collect_stats() as stats, pytest.raises(ValueError, match="empty"):
+        train_strategy(sample_data, VZO_RSI, {"span": [1, 2]}, leaderboard=leaderboard)
+    assert stats.runs == 0
+
+
+def test_trainer_random_search_precomputes_only_the_runs(
+    sample_data: pl.DataFrame, monkeypatch
+):
+    ranges = {
+        "short_ma": range(2, 5),
+        "mid_ma": range(5, 8),
+        "long_ma": range(8, 12),
+        "window": range(10, 30, 5),
+        "window_dev": Interval(1.0, 3.0),
+    }
+    calls = []
+    indicators = BB_silico.indicators.__func__
+
+    def counted(cls, *args, **kwargs):
+        calls.append(kwargs)
+        return indicators(cls, *args, **kwargs)
+
+    monkeypatch.setattr(BB_silico, "indicators", classmethod(counted))
+    train_strategy(sample_data, BB_silico, ranges, search="random", budget=20)
+
+    # the runs themselves and the winner train and test runs call it too
+    assert len(calls) == 20 + 20 + 2